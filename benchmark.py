@@ -0,0 +1,402 @@
+"""Offline load test for the verification bot.
+
+Drives VerificationBot's event handlers directly with fake Discord members,
+reactions, DMs and modal submissions, and points the GoHighLevel webhook at
+a local stub server that can inject latency and errors. No Discord token or
+live guild is needed.
+
+Usage:
+    python benchmark.py --joins 1000 --rate 1000 --flow dm
+    python benchmark.py --joins 500 --rate 3000 --flow modal --crm-error-rate 0.1
+
+Bot settings (WELCOME_COALESCE_WINDOW, WEBHOOK_BATCH_SIZE, SCHEDULER_ROUTE_RATE,
+...) are read from the environment as usual, so the same run can be repeated
+with different tuning.
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import discord
+from aiohttp import web
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test for the verification bot")
+    parser.add_argument('--joins', type=int, default=200, help="number of synthetic members to join")
+    parser.add_argument('--rate', type=float, default=1000, help="joins per minute")
+    parser.add_argument('--flow', choices=('dm', 'modal'), default='dm', help="verification flow to drive")
+    parser.add_argument('--session-store', choices=('sqlite', 'memory'), default='sqlite')
+    parser.add_argument('--think-ms', type=float, default=50, help="delay between a user's steps")
+    parser.add_argument('--discord-latency-ms', type=float, default=40, help="latency of each fake Discord REST call")
+    parser.add_argument('--crm-latency-ms', type=float, default=150, help="latency of the stub CRM")
+    parser.add_argument('--crm-error-rate', type=float, default=0.0, help="fraction of CRM requests answered with HTTP 500")
+    parser.add_argument('--drain-timeout', type=float, default=60, help="seconds to wait for the outbox to drain")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+class Recorder:
+    """Raw per-stage latency samples"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def timed(self, stage):
+        recorder = self
+
+        class Timer:
+            def __enter__(self):
+                self.started = time.perf_counter()
+
+            def __exit__(self, *exc):
+                recorder.add(stage, time.perf_counter() - self.started)
+
+        return Timer()
+
+    def report(self):
+        lines = [f"{'stage':<28}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage, values in self.samples.items():
+            values = sorted(values)
+            p50 = values[int(0.50 * (len(values) - 1))]
+            p99 = values[int(0.99 * (len(values) - 1))]
+            lines.append(f"{stage:<28}{len(values):>8}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}{values[-1] * 1000:>10.1f}")
+        return '\n'.join(lines)
+
+
+class FakeDiscord:
+    """Shared state for the fake Discord objects: ids and REST latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.next_id = 10_000
+        self.rest_calls = 0
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    async def rest(self):
+        self.rest_calls += 1
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+
+class FakeRole:
+    def __init__(self, fake, name, position):
+        self.id = fake.new_id()
+        self.name = name
+        self.position = position
+
+
+class FakeMessage:
+    def __init__(self, fake, channel, author=None, content=''):
+        self.fake = fake
+        self.id = fake.new_id()
+        self.channel = channel
+        self.author = author
+        self.content = content
+
+    async def add_reaction(self, emoji):
+        await self.fake.rest()
+
+
+class FakeDMChannel(discord.DMChannel):
+    """Passes the bot's isinstance(message.channel, discord.DMChannel) check"""
+
+    def __init__(self):
+        pass
+
+
+class FakeTextChannel:
+    def __init__(self, fake, guild, name, on_send):
+        self.fake = fake
+        self.id = fake.new_id()
+        self.guild = guild
+        self.name = name
+        self.on_send = on_send
+
+    async def send(self, content=None, embed=None, view=None, delete_after=None):
+        await self.fake.rest()
+        message = FakeMessage(self.fake, self, content=content or '')
+        self.on_send(message)
+        return message
+
+
+class FakeMember:
+    def __init__(self, fake, guild, name, bot=False):
+        self.fake = fake
+        self.id = fake.new_id()
+        self.guild = guild
+        self.name = name
+        self.display_name = name
+        self.discriminator = '0'
+        self.mention = f'<@{self.id}>'
+        self.bot = bot
+        self.joined_at = datetime.now(timezone.utc)
+        self.roles = []
+        self.dm_channel = FakeDMChannel()
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def add_roles(self, *roles, reason=None):
+        await self.fake.rest()
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def edit(self, roles=None, reason=None):
+        await self.fake.rest()
+        if roles is not None:
+            self.roles = list(roles)
+
+    async def send(self, content=None, embed=None):
+        await self.fake.rest()
+        return FakeMessage(self.fake, self.dm_channel, content=content or '')
+
+
+class FakeGuild:
+    def __init__(self, fake, channel_name, role_name, on_send):
+        self.fake = fake
+        self.id = fake.new_id()
+        self.name = 'Benchmark guild'
+        self.members = {}
+        self.channels = [FakeTextChannel(fake, self, channel_name, on_send)]
+        self.roles = [FakeRole(fake, '@everyone', 0), FakeRole(fake, role_name, 1)]
+        self.me = FakeMember(fake, self, 'VerifyBot', bot=True)
+        self.me.guild_permissions = SimpleNamespace(manage_roles=True, administrator=False)
+        self.me.top_role = FakeRole(fake, 'VerifyBot', 10)
+        self.members[self.me.id] = self.me
+
+    def get_channel(self, channel_id):
+        return next((channel for channel in self.channels if channel.id == channel_id), None)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id):
+        await self.fake.rest()
+        member = self.members.get(user_id)
+        if member is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason='Not Found'), 'Unknown Member')
+        return member
+
+    async def create_role(self, name, color=None, reason=None):
+        await self.fake.rest()
+        role = FakeRole(self.fake, name, 1)
+        self.roles.append(role)
+        return role
+
+
+class FakeResponse:
+    def __init__(self, fake):
+        self.fake = fake
+        self.modal = None
+
+    async def send_message(self, content=None, embed=None, ephemeral=False):
+        await self.fake.rest()
+
+    async def send_modal(self, modal):
+        await self.fake.rest()
+        self.modal = modal
+
+
+class FakeInteraction:
+    def __init__(self, fake, member):
+        self.user = member
+        self.guild = member.guild
+        self.response = FakeResponse(fake)
+
+
+async def start_stub_crm(latency, error_rate, received):
+    """Local stand-in for the GoHighLevel webhook; returns (runner, url)"""
+    async def handle(request):
+        body = await request.json()
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        if random.random() < error_rate:
+            return web.Response(status=500, text='injected error')
+        now = time.perf_counter()
+        for record in body.get('records', [body]):
+            received.setdefault(record['user_id'], now)
+        received['__requests__'] = received.get('__requests__', 0) + 1
+        return web.Response(status=200)
+
+    app = web.Application()
+    app.router.add_post('/webhook', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f'http://{host}:{port}/webhook'
+
+
+async def run(args, bot_module):
+    random.seed(args.seed)
+    recorder = Recorder()
+    fake = FakeDiscord(args.discord_latency_ms / 1000)
+    join_times = {}
+    welcomed = {}
+    completion_started = {}
+
+    def on_channel_send(message):
+        # A welcome message mentions the members it welcomes
+        now = time.perf_counter()
+        for user_id, event in welcomed.items():
+            if not event.is_set() and f'<@{user_id}>' in message.content:
+                recorder.add('join_to_welcome', now - join_times[user_id])
+                event.set()
+
+    # The fake guild is not listed in the questionnaire config, so it gets the default one
+    questionnaire = bot_module.QuestionnaireConfig().default
+    guild = FakeGuild(fake, questionnaire.channel_name, questionnaire.role_name, on_channel_send)
+    channel = guild.channels[0]
+
+    received = {}
+    crm_runner, crm_url = await start_stub_crm(args.crm_latency_ms / 1000, args.crm_error_rate, received)
+    bot_module.GOHIGHLEVEL_WEBHOOK_URL = crm_url
+    bot_module.WEBHOOK_BULK_URL = crm_url
+
+    bot = bot_module.VerificationBot()
+    bot._connection.user = SimpleNamespace(id=guild.me.id, bot=True)
+    bot.get_guild = lambda guild_id: guild if guild_id == guild.id else None
+    bot.get_channel = guild.get_channel
+    bot.get_user = lambda user_id: guild.members.get(user_id)
+
+    async def no_sync(*args, **kwargs):
+        return []
+    bot.tree.sync = no_sync
+    await bot.setup_hook()
+
+    questions = len(questionnaire.questions)
+    think = args.think_ms / 1000
+
+    async def user_flow(index):
+        member = FakeMember(fake, guild, f'user{index}')
+        guild.members[member.id] = member
+        welcomed[member.id] = asyncio.Event()
+        answers = [f"Réponse détaillée {step + 1} du membre {index}: {random.random():.6f}" for step in range(questions)]
+
+        join_times[member.id] = time.perf_counter()
+        await bot.on_member_join(member)
+        await asyncio.wait_for(welcomed[member.id].wait(), timeout=300)
+        await asyncio.sleep(think)
+
+        if args.flow == 'modal':
+            interaction = FakeInteraction(fake, member)
+            with recorder.timed('button_to_modal'):
+                await bot.start_view.start_verification.callback(interaction)
+            modal = interaction.response.modal
+            await asyncio.sleep(think)
+            submit = FakeInteraction(fake, member)
+            for question_input, answer in zip(modal.question_inputs, answers):
+                question_input._refresh_state(submit, {'value': answer})
+            completion_started[str(member.id)] = time.perf_counter()
+            with recorder.timed('modal_submit_to_complete'):
+                await modal.on_submit(submit)
+            return
+
+        session = bot.verification_sessions.get(member.id)
+        payload = SimpleNamespace(
+            message_id=session.message_id, user_id=member.id, channel_id=channel.id,
+            guild_id=guild.id, emoji='✅', member=member
+        )
+        with recorder.timed('reaction_to_prompt'):
+            await bot.on_raw_reaction_add(payload)
+
+        for step, answer in enumerate(answers):
+            await asyncio.sleep(think)
+            message = FakeMessage(fake, member.dm_channel, author=member, content=answer)
+            if step < questions - 1:
+                with recorder.timed('dm_answer_to_prompt'):
+                    await bot.on_message(message)
+            else:
+                completion_started[str(member.id)] = time.perf_counter()
+                with recorder.timed('last_answer_to_complete'):
+                    await bot.on_message(message)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    interval = 60 / args.rate
+    tasks = []
+    for index in range(args.joins):
+        tasks.append(asyncio.create_task(user_flow(index)))
+        await asyncio.sleep(interval)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    flows_done = time.perf_counter()
+    failures = [result for result in results if isinstance(result, BaseException)]
+
+    # Let the outbox finish delivering to the stub CRM
+    deadline = time.perf_counter() + args.drain_timeout
+    while time.perf_counter() < deadline and bot.outbox.counts().get('pending', 0):
+        await asyncio.sleep(0.1)
+    finished = time.perf_counter()
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    for user_id, received_at in received.items():
+        if user_id in completion_started:
+            recorder.add('complete_to_crm', received_at - completion_started[user_id])
+
+    verified = sum(1 for member in guild.members.values()
+                   if not member.bot and any(role.name == questionnaire.role_name for role in member.roles))
+    crm_records = len([key for key in received if key != '__requests__'])
+    scheduler_stats = bot.scheduler.stats()
+    outbox_counts = bot.outbox.counts()
+    await bot.close()
+    await crm_runner.cleanup()
+
+    print(f"Benchmark: {args.joins} joins at {args.rate:g}/min, flow={args.flow}, store={args.session_store}")
+    print(f"Flows finished in {flows_done - started:.1f}s, outbox drained after {finished - started:.1f}s")
+    print(f"Verified: {verified}/{args.joins} ({verified / (flows_done - started):.1f}/s), failed flows: {len(failures)}")
+    if failures:
+        print(f"First failure: {failures[0]!r}")
+    print(f"CRM: {crm_records} records in {received.get('__requests__', 0)} request(s); outbox left: {outbox_counts}")
+    print(f"Fake Discord REST calls: {fake.rest_calls} ({fake.rest_calls / max(args.joins, 1):.1f} per member)")
+    print(f"Scheduler queue depth at end: {scheduler_stats['queue_depth']}")
+    for priority, stats in scheduler_stats['priorities'].items():
+        if stats['completed']:
+            print(f"  {priority:<11} completed={stats['completed']:<6} avg_wait={stats['avg_wait_ms']:.1f} ms "
+                  f"max_wait={stats['max_wait_ms']:.1f} ms")
+    print()
+    print(recorder.report())
+    print()
+    print(f"Peak traced Python memory: {peak_traced / 2**20:.1f} MiB; "
+          f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+
+def main():
+    args = parse_args()
+
+    # The bot reads its configuration at import time
+    workdir = tempfile.mkdtemp(prefix='verifybot-bench-')
+    os.environ['BOT_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['SESSION_STORE'] = args.session_store
+    os.environ['VERIFICATION_FLOW'] = args.flow
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('OUTBOX_BACKOFF_BASE', '0.2')
+    os.environ.setdefault('OUTBOX_POLL_INTERVAL', '1')
+    # Synthetic members answer within seconds of joining; keep the speed rule from flagging all of them
+    os.environ.setdefault('SPAM_MIN_SECONDS', '0')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot as bot_module
+
+    import logging
+    logging.basicConfig(level=bot_module.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    asyncio.run(run(args, bot_module))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,124 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import aiohttp
+from aiohttp import web
 import asyncio
+import bisect
+import contextlib
+import hashlib
 import os
 from datetime import datetime, timezone
 from dotenv import load_dotenv
+import heapq
+import itertools
 import json
+import logging
+import random
 import re
+import signal
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
 
 # Load environment variables
 load_dotenv()
 
+log = logging.getLogger('verifybot')
+
 # Bot configuration
 DISCORD_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 GOHIGHLEVEL_WEBHOOK_URL = os.getenv('GOHIGHLEVEL_WEBHOOK_URL')
 VERIFY_CHANNEL_NAME = '✅-vérification-accès'
 VERIFIED_ROLE_NAME = 'Verified'
 
+# Webhook HTTP client configuration
+WEBHOOK_CONNECT_TIMEOUT = float(os.getenv('WEBHOOK_CONNECT_TIMEOUT', '5'))
+WEBHOOK_READ_TIMEOUT = float(os.getenv('WEBHOOK_READ_TIMEOUT', '15'))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', '10'))
+WEBHOOK_KEEPALIVE_TIMEOUT = float(os.getenv('WEBHOOK_KEEPALIVE_TIMEOUT', '60'))
+
+# Local storage and webhook outbox configuration
+BOT_DB_PATH = os.getenv('BOT_DB_PATH', 'verifybot.db')
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', '2'))
+OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', '600'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '30'))
+OUTBOX_DRAIN_BATCH = int(os.getenv('OUTBOX_DRAIN_BATCH', '50'))
+
+# Batched CRM delivery (disabled when WEBHOOK_BATCH_SIZE is 1)
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '1'))
+WEBHOOK_BATCH_INTERVAL_MS = int(os.getenv('WEBHOOK_BATCH_INTERVAL_MS', '500'))
+WEBHOOK_BATCH_MODE = os.getenv('WEBHOOK_BATCH_MODE', 'fanout')
+WEBHOOK_BULK_URL = os.getenv('WEBHOOK_BULK_URL') or GOHIGHLEVEL_WEBHOOK_URL
+
+# Verification session storage backend: 'sqlite' (survives restarts) or 'memory'
+SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite')
+SESSION_TTL_HOURS = float(os.getenv('SESSION_TTL_HOURS', '72'))
+SESSION_MAX_ACTIVE = int(os.getenv('SESSION_MAX_ACTIVE', '0'))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))
+
+# Per-stage timeouts (seconds) for the completion pipeline
+COMPLETION_ROLE_TIMEOUT = float(os.getenv('COMPLETION_ROLE_TIMEOUT', '30'))
+COMPLETION_DM_TIMEOUT = float(os.getenv('COMPLETION_DM_TIMEOUT', '15'))
+COMPLETION_CRM_TIMEOUT = float(os.getenv('COMPLETION_CRM_TIMEOUT', '5'))
+
+# Coalesce welcome messages for joins within this many seconds (0 sends one per member)
+WELCOME_COALESCE_WINDOW = float(os.getenv('WELCOME_COALESCE_WINDOW', '0'))
+WELCOME_COALESCE_MAX = int(os.getenv('WELCOME_COALESCE_MAX', '25'))
+
+# Outbound Discord request scheduler: worker counts and per-route token buckets.
+# Question prompts have their own workers so a backlog of welcome sends can never
+# hold them up; channel routes default to Discord's 5 messages per 5 seconds.
+SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', '8'))
+SCHEDULER_PROMPT_WORKERS = max(1, int(os.getenv('SCHEDULER_PROMPT_WORKERS', '2')))
+SCHEDULER_ROUTE_RATE = float(os.getenv('SCHEDULER_ROUTE_RATE', '5'))
+SCHEDULER_ROUTE_BURST = float(os.getenv('SCHEDULER_ROUTE_BURST', '5'))
+SCHEDULER_CHANNEL_RATE = float(os.getenv('SCHEDULER_CHANNEL_RATE', '1'))
+SCHEDULER_CHANNEL_BURST = float(os.getenv('SCHEDULER_CHANNEL_BURST', '5'))
+
+# Outbound request priority classes, most urgent first
+PRIORITY_PROMPT = 0
+PRIORITY_COMPLETION = 1
+PRIORITY_WELCOME = 2
+PRIORITY_ADMIN = 3
+PRIORITY_BACKFILL = 4
+PRIORITY_NAMES = {
+    PRIORITY_PROMPT: 'prompt',
+    PRIORITY_COMPLETION: 'completion',
+    PRIORITY_WELCOME: 'welcome',
+    PRIORITY_ADMIN: 'admin',
+    PRIORITY_BACKFILL: 'backfill'
+}
+
+# Logging and metrics; the /metrics endpoint is only served when METRICS_PORT is set
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Slash command sync: auto (only when the command tree changed), always, or off.
+# DEV_GUILD_ID syncs to that one guild instead, which Discord applies instantly.
+COMMAND_SYNC = os.getenv('COMMAND_SYNC', 'auto').lower()
+DEV_GUILD_ID = int(os.getenv('DEV_GUILD_ID') or '0')
+
+# Lean gateway mode for large guilds: no member chunking at startup and no guild
+# member cache; only members with an active verification session are kept
+LEAN_GATEWAY = os.getenv('LEAN_GATEWAY', 'false').lower() in ('1', 'true', 'yes')
+
+# Backfill of members who joined while the bot was offline. Runs from /backfill,
+# resumes an interrupted sweep at startup, and repeats every BACKFILL_INTERVAL_HOURS
+# (0 = admin-triggered only); scheduled sweeps never welcome the same member twice.
+# BACKFILL_MAX_AGE_DAYS limits sweeps to recent joins (0 = all).
+BACKFILL_INTERVAL_HOURS = float(os.getenv('BACKFILL_INTERVAL_HOURS', '0'))
+BACKFILL_PAGE_SIZE = min(int(os.getenv('BACKFILL_PAGE_SIZE', '1000')), 1000)
+BACKFILL_MAX_AGE_DAYS = float(os.getenv('BACKFILL_MAX_AGE_DAYS', '0'))
+
+# Verified roles that could not be assigned are queued and retried when roles or the
+# bot's member change, and every ROLE_RETRY_INTERVAL seconds, ROLE_RETRY_BATCH at a time
+ROLE_RETRY_INTERVAL = float(os.getenv('ROLE_RETRY_INTERVAL', '300'))
+ROLE_RETRY_BATCH = int(os.getenv('ROLE_RETRY_BATCH', '10'))
+
 # Verification questions (in French)
 VERIFICATION_QUESTIONS = [
     "Quel est votre niveau d’expérience avec Amazon FBA ?",
@@ -29,15 +131,1169 @@ VERIFICATION_QUESTIONS = [
 # Question keys for JSON payload
 QUESTION_KEYS = ['interest', 'experience', 'challenge', 'status']
 
+# Embed text of the built-in questionnaire. A questionnaire config can override any
+# of these; {role} and {count} are filled in once, {mentions}, {name} and {member} per send.
+DEFAULT_MESSAGES = {
+    'welcome_title': "🎉 Bienvenue dans la communauté Amazon FBA!",
+    'welcome_reaction': "Hey {mentions}! Pour obtenir la vérification et accéder à tous les canaux, veuillez réagir avec ✅ à ce message pour démarrer le processus de vérification.",
+    'welcome_button': "Hey {mentions}! Pour obtenir la vérification et accéder à tous les canaux, veuillez cliquer sur le bouton ci-dessous pour démarrer le processus de vérification.",
+    'welcome_steps_title': "📝 Ce qui se passe ensuite:",
+    'welcome_steps_reaction': "• Réagissez avec ✅ ci-dessous pour démarrer\n• Répondez à {count} questions Amazon FBA en privé\n• Obtenez votre rôle Vérifié automatiquement",
+    'welcome_steps_button': "• Cliquez sur le bouton ci-dessous pour démarrer\n• Répondez à {count} questions Amazon FBA dans un formulaire privé\n• Obtenez votre rôle Vérifié automatiquement",
+    'welcome_footer': "Bienvenue {name}!",
+    'welcome_footer_many': "Bienvenue à tous!",
+    'question_hint_title': "📝 Comment répondre:",
+    'question_hint': "Veuillez répondre à ce DM avec votre réponse. Votre réponse sera privée.",
+    'dm_required_title': "⚠️ DM requis",
+    'dm_required': "{member} Veuillez activer les DM des membres du serveur pour compléter la vérification, ou contactez un administrateur pour de l'aide.",
+    'answers_done_title': "✅ Toutes les questions répondues!",
+    'answers_done': "Traitement de votre vérification...",
+    'completion_title': "🎉 Vous êtes maintenant vérifié! Bienvenue à bord!",
+    'completion': "Merci d'avoir complété le processus de vérification. Vous avez maintenant accès à tous les canaux de la communauté Amazon FBA!",
+    'review_title': "✅ Vérification complète - Revue requise par l'administrateur",
+    'review': "Vous avez répondu avec succès à toutes les questions de vérification! Votre rôle `{role}` vous sera attribué automatiquement dès qu'un administrateur aura corrigé les permissions du bot.",
+    'admin_title': "🔧 Permissions du bot à corriger",
+    'admin': "**{member} a complété la vérification** mais je ne peux pas attribuer le rôle `{role}` pour le moment.\n\n**Action requise par l'administrateur:**\nDonnez au bot la permission Gérer les rôles et placez son rôle au-dessus de `{role}`. Le rôle sera ensuite attribué automatiquement à tous les membres en attente.",
+    'modal_title': "Vérification Amazon FBA",
+    'under_review_title': "🕵️ Vérification en cours d'examen",
+    'under_review': "Merci pour vos réponses! Elles doivent être examinées par un administrateur avant que votre rôle `{role}` vous soit attribué."
+}
+
+# Optional per-guild questionnaires (see questionnaires.example.json), re-read when
+# the file's mtime changes; without the file every guild uses the built-in one
+QUESTIONNAIRE_CONFIG = os.getenv('QUESTIONNAIRE_CONFIG', 'questionnaires.json')
+CONFIG_RELOAD_INTERVAL = float(os.getenv('CONFIG_RELOAD_INTERVAL', '10'))
+
+# Verification flow: 'dm' (react, then answer each question by DM) or 'modal'
+# (a persistent button opens one modal with every question)
+VERIFICATION_FLOW = os.getenv('VERIFICATION_FLOW', 'dm')
+
+# Discord allows at most five text inputs per modal
+MODAL_MAX_INPUTS = 5
+
+# Spam screening before completion. Flagged answers go to a review queue
+# (python bot.py review) instead of the role grant and the CRM.
+# SPAM_DENY_PATTERNS is a JSON list of case-insensitive regular expressions.
+SPAM_FILTER = os.getenv('SPAM_FILTER', 'true').lower() in ('1', 'true', 'yes')
+SPAM_MIN_ANSWER_LENGTH = int(os.getenv('SPAM_MIN_ANSWER_LENGTH', '2'))
+SPAM_MIN_SECONDS = float(os.getenv('SPAM_MIN_SECONDS', '20'))
+SPAM_DENY_PATTERNS = json.loads(os.getenv('SPAM_DENY_PATTERNS') or '["https?://", "discord\\\\.gg/", "(.)\\\\1{9,}"]')
+SPAM_DUPLICATE_WINDOW = int(os.getenv('SPAM_DUPLICATE_WINDOW', '5000'))
+SPAM_DUPLICATE_MIN_LENGTH = int(os.getenv('SPAM_DUPLICATE_MIN_LENGTH', '20'))
+
+# On SIGTERM/SIGINT, stop starting new verifications and give in-flight completions
+# and due CRM pushes up to this many seconds before shutting down
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', '25'))
+
+class Metrics:
+    """Counters and latency histograms rendered in Prometheus text format.
+    
+    Gauges are not stored; callbacks registered with add_gauges() are asked
+    for (name, labels, value) tuples when the metrics are rendered. Collected
+    names ending in _total are running totals kept elsewhere and are typed as
+    counters, so rate() works on them.
+    """
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # (name, labels) -> value
+        self.counters = {}
+        # (name, labels) -> [per-bucket counts, sum, count]
+        self.histograms = {}
+        self.gauge_callbacks = []
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+    
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+    
+    def add_gauges(self, callback):
+        self.gauge_callbacks.append(callback)
+    
+    @staticmethod
+    def format_labels(labels, **extra):
+        items = list(labels) + list(extra.items())
+        if not items:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+    
+    def render(self):
+        lines = []
+        typed = set()
+        
+        def declare(name, metric_type):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {metric_type}")
+        
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(name, 'counter')
+            lines.append(f"{name}{self.format_labels(labels)} {value}")
+        
+        for (name, labels), (counts, total, count) in sorted(self.histograms.items()):
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{self.format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_bucket{self.format_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{self.format_labels(labels)} {total}")
+            lines.append(f"{name}_count{self.format_labels(labels)} {count}")
+        
+        for callback in self.gauge_callbacks:
+            try:
+                gauges = list(callback())
+            except Exception:
+                log.exception("Error collecting gauges")
+                continue
+            for name, labels, value in gauges:
+                declare(name, 'counter' if name.endswith('_total') else 'gauge')
+                lines.append(f"{name}{self.format_labels(sorted(labels.items()))} {value}")
+        
+        return '\n'.join(lines) + '\n'
+
+def open_database(path=BOT_DB_PATH):
+    """Open the bot's local SQLite database in WAL mode"""
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    return db
+
+class WebhookOutbox:
+    """Durable queue of webhook payloads waiting to be delivered to the CRM"""
+    
+    def __init__(self, path=BOT_DB_PATH):
+        self.db = open_database(path)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS webhook_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due ON webhook_outbox (status, next_attempt_at)'
+        )
+    
+    def enqueue(self, payload):
+        """Append a payload to the outbox and return its row id"""
+        now = time.time()
+        cursor = self.db.execute(
+            'INSERT INTO webhook_outbox (payload, next_attempt_at, created_at) VALUES (?, ?, ?)',
+            (json.dumps(payload), now, now)
+        )
+        return cursor.lastrowid
+    
+    def due(self, limit=OUTBOX_DRAIN_BATCH):
+        """Return (id, payload, attempts) for pending rows whose retry time has come"""
+        rows = self.db.execute(
+            "SELECT id, payload, attempts FROM webhook_outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT ?",
+            (time.time(), limit)
+        ).fetchall()
+        return [(row_id, json.loads(payload), attempts) for row_id, payload, attempts in rows]
+    
+    def next_due_at(self):
+        """Timestamp of the next pending retry, or None if the outbox is empty"""
+        row = self.db.execute(
+            "SELECT MIN(next_attempt_at) FROM webhook_outbox WHERE status = 'pending'"
+        ).fetchone()
+        return row[0]
+    
+    def mark_delivered(self, row_id):
+        self.db.execute('DELETE FROM webhook_outbox WHERE id = ?', (row_id,))
+    
+    def mark_failed(self, row_id, attempts, error, retryable=True):
+        """Schedule a retry with exponential backoff and jitter, or dead-letter the row"""
+        if not retryable or attempts >= OUTBOX_MAX_ATTEMPTS:
+            self.db.execute(
+                "UPDATE webhook_outbox SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, row_id)
+            )
+            return False
+        
+        delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.db.execute(
+            'UPDATE webhook_outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?',
+            (attempts, error, time.time() + delay, row_id)
+        )
+        return True
+    
+    def replay_dead(self):
+        """Move every dead-lettered row back to pending and return how many were moved"""
+        cursor = self.db.execute(
+            "UPDATE webhook_outbox SET status = 'pending', attempts = 0, next_attempt_at = ? "
+            "WHERE status = 'dead'",
+            (time.time(),)
+        )
+        return cursor.rowcount
+    
+    def counts(self):
+        """Number of rows per status"""
+        rows = self.db.execute('SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status').fetchall()
+        return dict(rows)
+    
+    def close(self):
+        self.db.close()
+
+class BotState:
+    """Small key/value table for bot bookkeeping that must survive restarts"""
+    
+    def __init__(self, path=BOT_DB_PATH):
+        self.db = open_database(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS bot_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+    
+    def get(self, key, default=None):
+        row = self.db.execute('SELECT value FROM bot_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+    
+    def set(self, key, value):
+        self.db.execute(
+            'INSERT INTO bot_state (key, value) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, value)
+        )
+    
+    def delete(self, key):
+        self.db.execute('DELETE FROM bot_state WHERE key = ?', (key,))
+    
+    def keys(self, prefix):
+        rows = self.db.execute('SELECT key FROM bot_state WHERE key LIKE ?', (prefix + '%',)).fetchall()
+        return [row[0] for row in rows]
+    
+    def close(self):
+        self.db.close()
+
+class PendingGrants:
+    """Durable queue of members whose Verified role could not be assigned yet"""
+    
+    def __init__(self, path=BOT_DB_PATH):
+        self.db = open_database(path)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS pending_role_grants (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (guild_id, user_id)
+            )"""
+        )
+    
+    def add(self, guild_id, user_id, error=None):
+        self.db.execute(
+            'INSERT INTO pending_role_grants (guild_id, user_id, last_error, created_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(guild_id, user_id) DO UPDATE SET last_error = COALESCE(excluded.last_error, last_error)',
+            (guild_id, user_id, error, time.time())
+        )
+    
+    def for_guild(self, guild_id, limit):
+        """Oldest queued user ids for a guild"""
+        rows = self.db.execute(
+            'SELECT user_id FROM pending_role_grants WHERE guild_id = ? ORDER BY created_at LIMIT ?',
+            (guild_id, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+    
+    def guild_ids(self):
+        return [row[0] for row in self.db.execute('SELECT DISTINCT guild_id FROM pending_role_grants')]
+    
+    def has(self, guild_id, user_id):
+        row = self.db.execute(
+            'SELECT 1 FROM pending_role_grants WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)
+        ).fetchone()
+        return row is not None
+    
+    def record_failure(self, guild_id, user_id, error):
+        self.db.execute(
+            'UPDATE pending_role_grants SET attempts = attempts + 1, last_error = ? WHERE guild_id = ? AND user_id = ?',
+            (error, guild_id, user_id)
+        )
+    
+    def remove(self, guild_id, user_id):
+        self.db.execute('DELETE FROM pending_role_grants WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))
+    
+    def count(self):
+        return self.db.execute('SELECT COUNT(*) FROM pending_role_grants').fetchone()[0]
+    
+    def close(self):
+        self.db.close()
+
+class ReviewQueue:
+    """Completed questionnaires held back by the spam filter until an admin decides"""
+    
+    def __init__(self, path=BOT_DB_PATH):
+        self.db = open_database(path)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS review_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                reasons TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL,
+                decided_at REAL
+            )"""
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS idx_review_queue_member ON review_queue (guild_id, user_id)')
+    
+    def add(self, guild_id, user_id, payload, reasons):
+        cursor = self.db.execute(
+            'INSERT INTO review_queue (guild_id, user_id, payload, reasons, created_at) VALUES (?, ?, ?, ?, ?)',
+            (guild_id, user_id, json.dumps(payload), ','.join(reasons), time.time())
+        )
+        return cursor.lastrowid
+    
+    def pending(self, limit=50):
+        """Return (id, guild_id, user_id, payload, reasons) for undecided entries, oldest first"""
+        rows = self.db.execute(
+            "SELECT id, guild_id, user_id, payload, reasons FROM review_queue "
+            "WHERE status = 'pending' ORDER BY id LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [(row_id, guild_id, user_id, json.loads(payload), reasons.split(','))
+                for row_id, guild_id, user_id, payload, reasons in rows]
+    
+    def is_held(self, guild_id, user_id):
+        """Whether the member has an entry awaiting review or was rejected"""
+        row = self.db.execute(
+            "SELECT 1 FROM review_queue WHERE guild_id = ? AND user_id = ? AND status IN ('pending', 'rejected')",
+            (guild_id, user_id)
+        ).fetchone()
+        return row is not None
+    
+    def decide(self, row_id, status):
+        """Approve or reject a pending entry; returns (guild_id, user_id, payload), or None if not pending"""
+        row = self.db.execute(
+            "SELECT guild_id, user_id, payload FROM review_queue WHERE id = ? AND status = 'pending'",
+            (row_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute(
+            'UPDATE review_queue SET status = ?, decided_at = ? WHERE id = ?',
+            (status, time.time(), row_id)
+        )
+        return row[0], row[1], json.loads(row[2])
+    
+    def counts(self):
+        rows = self.db.execute('SELECT status, COUNT(*) FROM review_queue GROUP BY status').fetchall()
+        return dict(rows)
+    
+    def close(self):
+        self.db.close()
+
+class VerificationSession:
+    """Questionnaire state for one member"""
+    
+    __slots__ = ('user_id', 'guild_id', 'join_date', 'step', 'answers', 'message_id', 'awaiting_dm',
+                 'prompt_step', 'last_active')
+    
+    def __init__(self, user_id, guild_id, join_date, step=0, answers=None, message_id=None,
+                 awaiting_dm=False, prompt_step=None, last_active=None):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.join_date = join_date
+        self.step = step
+        self.answers = answers if answers is not None else []
+        self.message_id = message_id
+        self.awaiting_dm = awaiting_dm
+        # Step of the question last sent by DM, so a late reply cannot answer another step
+        self.prompt_step = prompt_step
+        self.last_active = last_active if last_active is not None else time.time()
+    
+    def to_dict(self):
+        data = {slot: getattr(self, slot) for slot in self.__slots__}
+        data['join_date'] = self.join_date.isoformat()
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['join_date'] = datetime.fromisoformat(data['join_date'])
+        return cls(**data)
+
+class SessionStore:
+    """Storage for verification sessions, keyed by user id.
+    
+    Sessions expire SESSION_TTL_HOURS after their last put(). Expiry is driven
+    by a min-heap of deadlines, so a sweep only touches sessions that are due.
+    With SESSION_MAX_ACTIVE set, the least recently used resident sessions are
+    evicted once the cap is exceeded. Call put() after changing a session so
+    persistent backends can write it through.
+    """
+    
+    def __init__(self, ttl=None, max_active=None):
+        self.ttl = SESSION_TTL_HOURS * 3600 if ttl is None else ttl
+        self.max_active = SESSION_MAX_ACTIVE if max_active is None else max_active
+        # Resident sessions in least-recently-used order
+        self.resident = OrderedDict()
+        # (expires_at, user_id); entries may be stale and are re-checked when popped
+        self.expiry_heap = []
+        # Welcome message id -> ids of the users it welcomed, so a reaction costs one dict lookup
+        self.message_index = {}
+        # Optional callback(session) run after the LRU cap drops a session from memory
+        self.on_evict = None
+        self.evicted_count = 0
+        self.expired_count = 0
+    
+    # Backend hooks
+    
+    def load(self, user_id):
+        """Load a non-resident session from backing storage"""
+        return None
+    
+    def save(self, session):
+        pass
+    
+    def remove(self, user_id):
+        pass
+    
+    def stored(self, user_id):
+        """Whether backing storage holds a live session for user_id, without loading it"""
+        return False
+    
+    def evict(self, session):
+        """Called when a session is dropped from memory by the LRU cap"""
+        self.unindex_message(session.message_id, session.user_id)
+    
+    def purge_stale(self, cutoff):
+        """Remove non-resident sessions last touched before cutoff; return how many"""
+        return 0
+    
+    def snapshot(self):
+        """Persist sessions that would not survive a restart; return how many"""
+        return 0
+    
+    def restore(self):
+        """Reload sessions saved by snapshot(); return how many"""
+        return 0
+    
+    # Public API
+    
+    def get(self, user_id):
+        session = self.resident.get(user_id)
+        if session is not None:
+            self.resident.move_to_end(user_id)
+            return session
+        
+        session = self.load(user_id)
+        if session is None:
+            return None
+        if self.ttl and session.last_active + self.ttl <= time.time():
+            self.remove(user_id)
+            self.expired_count += 1
+            return None
+        self.remember(session)
+        return session
+    
+    def put(self, session):
+        session.last_active = time.time()
+        self.save(session)
+        self.remember(session)
+    
+    def delete(self, user_id):
+        session = self.resident.pop(user_id, None)
+        if session is not None:
+            self.unindex_message(session.message_id, user_id)
+        self.remove(user_id)
+    
+    def is_welcome_for(self, message_id, user_id):
+        """Whether message_id is the welcome message of user_id's session"""
+        return user_id in self.message_index.get(message_id, ())
+    
+    def index_message(self, message_id, user_id):
+        self.message_index.setdefault(message_id, set()).add(user_id)
+    
+    def unindex_message(self, message_id, user_id):
+        users = self.message_index.get(message_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.message_index[message_id]
+    
+    def __contains__(self, user_id):
+        # Membership never loads a session, so checking it does not defeat the LRU cap
+        return user_id in self.resident or self.stored(user_id)
+    
+    def remember(self, session):
+        """Make a session resident, tracking its expiry and enforcing the LRU cap"""
+        is_new = session.user_id not in self.resident
+        self.resident[session.user_id] = session
+        self.resident.move_to_end(session.user_id)
+        if session.message_id:
+            self.index_message(session.message_id, session.user_id)
+        if is_new and self.ttl:
+            heapq.heappush(self.expiry_heap, (session.last_active + self.ttl, session.user_id))
+        
+        while self.max_active and len(self.resident) > self.max_active:
+            _, evicted = self.resident.popitem(last=False)
+            self.evict(evicted)
+            self.evicted_count += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+    
+    def expire(self, now=None):
+        """Drop sessions whose TTL has elapsed and return how many were dropped"""
+        if not self.ttl:
+            return 0
+        now = time.time() if now is None else now
+        expired = 0
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            _, user_id = heapq.heappop(self.expiry_heap)
+            session = self.resident.get(user_id)
+            if session is None:
+                continue
+            deadline = session.last_active + self.ttl
+            if deadline > now:
+                # Touched since this entry was pushed; track the new deadline
+                heapq.heappush(self.expiry_heap, (deadline, user_id))
+                continue
+            self.delete(user_id)
+            expired += 1
+        expired += self.purge_stale(now - self.ttl)
+        self.expired_count += expired
+        return expired
+    
+    def stats(self):
+        return {
+            'active': len(self.resident),
+            'evicted': self.evicted_count,
+            'expired': self.expired_count
+        }
+    
+    def close(self):
+        pass
+
+class MemorySessionStore(SessionStore):
+    """In-process session store; sessions are lost on LRU eviction, and on restart
+    unless the bot shuts down cleanly and snapshots them to SQLite
+    """
+    
+    def __init__(self, path=BOT_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+    
+    def snapshot(self):
+        db = open_database(self.path)
+        try:
+            db.execute('CREATE TABLE IF NOT EXISTS session_snapshot (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+            db.execute('BEGIN')
+            db.execute('DELETE FROM session_snapshot')
+            db.executemany(
+                'INSERT INTO session_snapshot (user_id, data) VALUES (?, ?)',
+                [(session.user_id, json.dumps(session.to_dict())) for session in self.resident.values()]
+            )
+            db.execute('COMMIT')
+        finally:
+            db.close()
+        return len(self.resident)
+    
+    def restore(self):
+        db = open_database(self.path)
+        try:
+            db.execute('CREATE TABLE IF NOT EXISTS session_snapshot (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+            rows = db.execute('SELECT data FROM session_snapshot').fetchall()
+            db.execute('DELETE FROM session_snapshot')
+        finally:
+            db.close()
+        
+        restored = 0
+        now = time.time()
+        for (data,) in rows:
+            session = VerificationSession.from_dict(json.loads(data))
+            if self.ttl and session.last_active + self.ttl <= now:
+                continue
+            self.remember(session)
+            restored += 1
+        return restored
+
+class SqliteSessionStore(SessionStore):
+    """Session store persisted to SQLite; sessions are loaded lazily on first access.
+    
+    The LRU cap only bounds the sessions held in memory; evicted sessions stay
+    on disk and are reloaded when their member next interacts. The welcome
+    message index covers every stored session and is rebuilt at startup.
+    """
+    
+    def __init__(self, path=BOT_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.db = open_database(path)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS verification_sessions (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                message_id INTEGER,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(verification_sessions)')]
+        if 'message_id' not in columns:
+            self.db.execute('ALTER TABLE verification_sessions ADD COLUMN message_id INTEGER')
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_verification_sessions_updated ON verification_sessions (updated_at)'
+        )
+        for message_id, user_id in self.db.execute(
+            'SELECT message_id, user_id FROM verification_sessions WHERE message_id IS NOT NULL'
+        ):
+            self.index_message(message_id, user_id)
+    
+    def load(self, user_id):
+        row = self.db.execute(
+            'SELECT data FROM verification_sessions WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return VerificationSession.from_dict(json.loads(row[0])) if row else None
+    
+    def save(self, session):
+        self.db.execute(
+            'INSERT OR REPLACE INTO verification_sessions (user_id, data, message_id, updated_at) VALUES (?, ?, ?, ?)',
+            (session.user_id, json.dumps(session.to_dict()), session.message_id, session.last_active)
+        )
+    
+    def remove(self, user_id):
+        row = self.db.execute(
+            'SELECT message_id FROM verification_sessions WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        if row:
+            self.unindex_message(row[0], user_id)
+            self.db.execute('DELETE FROM verification_sessions WHERE user_id = ?', (user_id,))
+    
+    def stored(self, user_id):
+        cutoff = time.time() - self.ttl if self.ttl else 0
+        row = self.db.execute(
+            'SELECT 1 FROM verification_sessions WHERE user_id = ? AND updated_at > ?', (user_id, cutoff)
+        ).fetchone()
+        return row is not None
+    
+    def evict(self, session):
+        # Still stored on disk, so its welcome message stays indexed
+        pass
+    
+    def purge_stale(self, cutoff):
+        for message_id, user_id in self.db.execute(
+            'SELECT message_id, user_id FROM verification_sessions WHERE updated_at < ? AND message_id IS NOT NULL', (cutoff,)
+        ).fetchall():
+            self.unindex_message(message_id, user_id)
+        cursor = self.db.execute('DELETE FROM verification_sessions WHERE updated_at < ?', (cutoff,))
+        return cursor.rowcount
+    
+    def close(self):
+        self.db.close()
+
+def create_session_store():
+    """Build the session store selected by SESSION_STORE"""
+    if SESSION_STORE == 'memory':
+        return MemorySessionStore()
+    return SqliteSessionStore()
+
+class StageResult:
+    """Outcome of one stage of the completion pipeline"""
+    
+    __slots__ = ('name', 'ok', 'duration', 'error')
+    
+    def __init__(self, name, ok, duration, error=None):
+        self.name = name
+        self.ok = ok
+        self.duration = duration
+        self.error = error
+    
+    def __str__(self):
+        if self.ok:
+            status = f"ok ({self.error})" if self.error else 'ok'
+        else:
+            status = f"failed ({self.error})" if self.error else 'failed'
+        return f"{self.name}={status} in {self.duration * 1000:.0f} ms"
+
+class KeyedLocks:
+    """Per-key asyncio locks, created on demand and dropped once nobody holds or waits on them"""
+    
+    def __init__(self):
+        # key -> [lock, number of holders and waiters]
+        self.locks = {}
+    
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[key]
+    
+    def __len__(self):
+        return len(self.locks)
+
+def fill_placeholders(text, **values):
+    """Replace {name} placeholders without str.format, so other braces in config text are kept"""
+    for name, value in values.items():
+        text = text.replace('{' + name + '}', str(value))
+    return text
+
+class Questionnaire:
+    """A validated questionnaire with its embeds prebuilt; send copies via embed()"""
+    
+    def __init__(self, name, channel_name, role_name, questions, keys, messages):
+        self.name = name
+        self.channel_name = channel_name
+        self.role_name = role_name
+        self.questions = questions
+        self.keys = keys
+        self.messages = messages
+        self.templates = self.compile()
+    
+    @classmethod
+    def from_config(cls, name, data, base=None):
+        """Validate one config entry, inheriting anything it leaves out from `base`"""
+        if not isinstance(data, dict):
+            raise ValueError(f"{name}: expected an object")
+        unknown = set(data) - {'name', 'channel', 'role', 'questions', 'messages'}
+        if unknown:
+            raise ValueError(f"{name}: unknown fields {sorted(unknown)}")
+        if not isinstance(data.get('name', name), str):
+            raise ValueError(f"{name}: name must be a string")
+        
+        channel_name = data.get('channel', base.channel_name if base else VERIFY_CHANNEL_NAME)
+        role_name = data.get('role', base.role_name if base else VERIFIED_ROLE_NAME)
+        for field, value in (('channel', channel_name), ('role', role_name)):
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"{name}: {field} must be a non-empty string")
+        
+        if 'questions' in data:
+            questions = data['questions']
+            if not isinstance(questions, list) or not questions:
+                raise ValueError(f"{name}: questions must be a non-empty list")
+            if any(not isinstance(question, dict) or set(question) != {'key', 'text'} for question in questions):
+                raise ValueError(f"{name}: each question needs exactly a key and a text")
+            keys = [question['key'] for question in questions]
+            texts = [question['text'] for question in questions]
+            if any(not isinstance(text, str) or not text.strip() or len(text) > 1000 for text in texts):
+                raise ValueError(f"{name}: question texts must be 1-1000 characters")
+            if any(not isinstance(key, str) or not re.fullmatch(r'[A-Za-z0-9_]+', key) for key in keys):
+                raise ValueError(f"{name}: question keys may only contain letters, digits and _")
+            if len(set(keys)) != len(keys):
+                raise ValueError(f"{name}: question keys must be unique")
+        elif base:
+            keys, texts = base.keys, base.questions
+        else:
+            keys, texts = QUESTION_KEYS, VERIFICATION_QUESTIONS
+        
+        messages = dict(base.messages if base else DEFAULT_MESSAGES)
+        overrides = data.get('messages', {})
+        if not isinstance(overrides, dict):
+            raise ValueError(f"{name}: messages must be an object")
+        unknown = set(overrides) - set(DEFAULT_MESSAGES)
+        if unknown:
+            raise ValueError(f"{name}: unknown messages {sorted(unknown)}")
+        if any(not isinstance(text, str) for text in overrides.values()):
+            raise ValueError(f"{name}: messages must be strings")
+        messages.update(overrides)
+        
+        return cls(data.get('name', name), channel_name, role_name, texts, keys, messages)
+    
+    def compile(self):
+        """Build every embed once, with the per-guild placeholders already filled in"""
+        static = {'role': self.role_name, 'count': len(self.questions)}
+        text = {key: fill_placeholders(value, **static) for key, value in self.messages.items()}
+        
+        def make(title, description, color, field=None):
+            embed = discord.Embed(title=text[title], description=text[description], color=color)
+            if field:
+                embed.add_field(name=text[field[0]], value=text[field[1]], inline=False)
+            return embed
+        
+        templates = {
+            'welcome_reaction': make('welcome_title', 'welcome_reaction', 0x00ff00,
+                                     ('welcome_steps_title', 'welcome_steps_reaction')),
+            'welcome_button': make('welcome_title', 'welcome_button', 0x00ff00,
+                                   ('welcome_steps_title', 'welcome_steps_button')),
+            'dm_required': make('dm_required_title', 'dm_required', 0xff9900),
+            'answers_done': make('answers_done_title', 'answers_done', 0x00ff00),
+            'completion': make('completion_title', 'completion', 0x00ff00),
+            'review': make('review_title', 'review', 0x00ff00),
+            'admin': make('admin_title', 'admin', 0xffa500)
+        }
+        for step, question in enumerate(self.questions):
+            embed = discord.Embed(
+                title=f"Question {step + 1} of {len(self.questions)}",
+                description=f"**{question}**",
+                color=0x3498db
+            )
+            embed.add_field(name=text['question_hint_title'], value=text['question_hint'], inline=False)
+            templates[('question', step)] = embed
+        
+        # Embed limits are checked here so a bad config fails at load time, not on send
+        for key, embed in templates.items():
+            if len(embed.title or '') > 256 or len(embed.description or '') > 4096 or len(embed) > 6000:
+                raise ValueError(f"{self.name}: embed {key} exceeds Discord's size limits")
+            if any(len(field.name) > 256 or len(field.value) > 1024 for field in embed.fields):
+                raise ValueError(f"{self.name}: embed {key} has a field over Discord's size limits")
+        return templates
+    
+    def embed(self, template, **values):
+        """A copy of a prebuilt embed with the per-send placeholders filled in"""
+        embed = self.templates[template].copy()
+        if values:
+            embed.description = fill_placeholders(embed.description, **values)
+        return embed
+    
+    def question_embed(self, step):
+        return self.templates[('question', step)].copy()
+    
+    def welcome_footer(self, members):
+        if len(members) == 1:
+            return fill_placeholders(self.messages['welcome_footer'], name=members[0].display_name)
+        return self.messages['welcome_footer_many']
+
+class QuestionnaireConfig:
+    """Questionnaires per guild id, loaded from a JSON file and reloaded when it changes.
+    
+    The file holds an optional "default" entry and a "guilds" object keyed by guild id;
+    guild entries inherit whatever they leave out from the default. An invalid file is
+    logged and ignored, keeping the questionnaires that were last loaded.
+    """
+    
+    def __init__(self, path=QUESTIONNAIRE_CONFIG):
+        self.path = path
+        self.mtime = None
+        self.default = Questionnaire.from_config('built-in', {})
+        self.guilds = {}
+        self.reload_if_changed()
+    
+    def for_guild(self, guild_id):
+        return self.guilds.get(guild_id, self.default)
+    
+    def reload_if_changed(self):
+        """Reload the file if its mtime changed; True when the questionnaires were replaced"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        
+        if mtime is None:
+            self.default = Questionnaire.from_config('built-in', {})
+            self.guilds = {}
+            return True
+        
+        try:
+            with open(self.path, encoding='utf-8') as config_file:
+                data = json.load(config_file)
+            if not isinstance(data, dict) or set(data) - {'default', 'guilds'}:
+                raise ValueError('expected an object with "default" and "guilds"')
+            default = Questionnaire.from_config('default', data.get('default', {}))
+            entries = data.get('guilds', {})
+            if not isinstance(entries, dict):
+                raise ValueError('"guilds" must be an object keyed by guild id')
+            guilds = {}
+            for guild_id, entry in entries.items():
+                if not guild_id.isdigit():
+                    raise ValueError(f"guild id {guild_id!r} is not a number")
+                guilds[int(guild_id)] = Questionnaire.from_config(f'guild {guild_id}', entry, default)
+        except (OSError, ValueError) as e:
+            log.error("Invalid questionnaire config %s, keeping the previous one: %s", self.path, e)
+            return False
+        
+        self.default = default
+        self.guilds = guilds
+        log.info("Loaded questionnaire config %s guilds=%d", self.path, len(guilds))
+        return True
+
+class GuildIndex:
+    """Per-guild ids of the verification channel and Verified role.
+    
+    Built once per guild and kept current from channel/role events, so the
+    hot path resolves both with a dict lookup instead of scanning the guild.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.channel_ids = {}
+        self.role_ids = {}
+        self.indexed_guilds = set()
+    
+    def reset(self):
+        """Re-index every guild lazily, e.g. after the channel or role names changed"""
+        self.indexed_guilds.clear()
+    
+    def build(self, guild):
+        self.refresh_channel(guild)
+        self.refresh_role(guild)
+        self.indexed_guilds.add(guild.id)
+    
+    def forget(self, guild):
+        self.channel_ids.pop(guild.id, None)
+        self.role_ids.pop(guild.id, None)
+        self.indexed_guilds.discard(guild.id)
+    
+    def refresh_channel(self, guild):
+        channel = discord.utils.get(guild.channels, name=self.config.for_guild(guild.id).channel_name)
+        if channel:
+            self.channel_ids[guild.id] = channel.id
+        else:
+            self.channel_ids.pop(guild.id, None)
+    
+    def refresh_role(self, guild):
+        role = discord.utils.get(guild.roles, name=self.config.for_guild(guild.id).role_name)
+        if role:
+            self.role_ids[guild.id] = role.id
+        else:
+            self.role_ids.pop(guild.id, None)
+    
+    def verify_channel(self, guild):
+        if guild.id not in self.indexed_guilds:
+            self.build(guild)
+        channel_id = self.channel_ids.get(guild.id)
+        return guild.get_channel(channel_id) if channel_id else None
+    
+    def verified_role(self, guild):
+        if guild.id not in self.indexed_guilds:
+            self.build(guild)
+        role_id = self.role_ids.get(guild.id)
+        return guild.get_role(role_id) if role_id else None
+    
+    def channel_changed(self, guild, *channels):
+        """Re-index the channel if any of the given channel states concern it"""
+        if guild.id not in self.indexed_guilds:
+            return
+        cached_id = self.channel_ids.get(guild.id)
+        name = self.config.for_guild(guild.id).channel_name
+        if any(channel.name == name or channel.id == cached_id for channel in channels):
+            self.refresh_channel(guild)
+    
+    def role_changed(self, guild, *roles):
+        """Re-index the role if any of the given role states concern it"""
+        if guild.id not in self.indexed_guilds:
+            return
+        cached_id = self.role_ids.get(guild.id)
+        name = self.config.for_guild(guild.id).role_name
+        if any(role.name == name or role.id == cached_id for role in roles):
+            self.refresh_role(guild)
+
+class SpamFilter:
+    """Cheap screening of completed questionnaires before they reach the role grant and the CRM.
+    
+    Rules are compiled once. Identical answer sets are detected with a rolling set of hashes
+    from the last SPAM_DUPLICATE_WINDOW completions. Only the whole set is compared, and only
+    when its answers average SPAM_DUPLICATE_MIN_LENGTH characters: single answers such as
+    "je ne sais pas encore" are given word for word by genuine members.
+    """
+    
+    def __init__(self, deny_patterns=SPAM_DENY_PATTERNS, window=SPAM_DUPLICATE_WINDOW):
+        self.deny = re.compile('|'.join(f'(?:{pattern})' for pattern in deny_patterns), re.IGNORECASE) if deny_patterns else None
+        self.window = window
+        self.seen = OrderedDict()
+    
+    @staticmethod
+    def digest(text):
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+    
+    def check(self, session, now=None):
+        """Return the reasons to hold a session for review; empty when it looks genuine"""
+        reasons = []
+        answers = [' '.join(answer.lower().split()) for answer in session.answers]
+        
+        if any(len(answer) < SPAM_MIN_ANSWER_LENGTH for answer in answers):
+            reasons.append('too_short')
+        if self.deny is not None and any(self.deny.search(answer) for answer in session.answers):
+            reasons.append('denied_pattern')
+        
+        now = now or datetime.now(timezone.utc)
+        if SPAM_MIN_SECONDS > 0 and (now - session.join_date).total_seconds() < SPAM_MIN_SECONDS:
+            reasons.append('too_fast')
+        
+        if answers and sum(map(len, answers)) >= SPAM_DUPLICATE_MIN_LENGTH * len(answers):
+            digest = self.digest('\x1f'.join(answers))
+            if self.seen.get(digest, session.user_id) != session.user_id:
+                reasons.append('duplicate')
+            self.seen[digest] = session.user_id
+            self.seen.move_to_end(digest)
+            while len(self.seen) > self.window:
+                self.seen.popitem(last=False)
+        
+        return reasons
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+    
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def take(self):
+        """Reserve a token; returns 0 if it is available now, else the seconds until it is.
+        
+        The balance may go negative, so each caller is handed its own future slot
+        instead of all waiters racing for the next token.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+    
+    def give_back(self):
+        """Return a reserved token that was not used"""
+        self.tokens += 1
+    
+    def is_full(self):
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+class OutboundScheduler:
+    """Runs outbound Discord requests by priority class, rate limited per route.
+    
+    Requests are submitted as zero-argument callables returning a coroutine.
+    Workers always take the most urgent runnable request; a request whose
+    route bucket is empty reserves the next free token and is parked until
+    then, so it never blocks other routes. discord.py also waits out Discord's own rate limits
+    inside a request, so question prompts go to a separate queue with its own
+    workers: general workers stuck in slow sends cannot delay them.
+    """
+    
+    def __init__(self, workers=SCHEDULER_WORKERS, prompt_workers=SCHEDULER_PROMPT_WORKERS,
+                 rate=SCHEDULER_ROUTE_RATE, burst=SCHEDULER_ROUTE_BURST,
+                 channel_rate=SCHEDULER_CHANNEL_RATE, channel_burst=SCHEDULER_CHANNEL_BURST):
+        self.workers = workers
+        self.prompt_workers = prompt_workers
+        self.rate = rate
+        self.burst = burst
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.queue = asyncio.PriorityQueue()
+        self.prompt_queue = asyncio.PriorityQueue()
+        self.buckets = {}
+        self.sequence = itertools.count()
+        self.parked = 0
+        self.wait_stats = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}
+    
+    def start(self):
+        """Start the worker tasks and return them"""
+        tasks = [asyncio.create_task(self.worker(self.queue)) for _ in range(self.workers)]
+        tasks.extend(asyncio.create_task(self.worker(self.prompt_queue)) for _ in range(self.prompt_workers))
+        return tasks
+    
+    def queue_for(self, priority):
+        return self.prompt_queue if priority == PRIORITY_PROMPT else self.queue
+    
+    async def submit(self, priority, route, request):
+        """Queue a request and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queue_for(priority).put_nowait((priority, next(self.sequence), route, request, future, loop.time(), False))
+        return await future
+    
+    def bucket(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            if len(self.buckets) > 10000:
+                # Idle routes have refilled completely and can be recreated on demand
+                self.buckets = {key: value for key, value in self.buckets.items() if not value.is_full()}
+            if route[0] == 'channel':
+                bucket = TokenBucket(self.channel_rate, self.channel_burst)
+            else:
+                bucket = TokenBucket(self.rate, self.burst)
+            self.buckets[route] = bucket
+        return bucket
+    
+    def unpark(self, item):
+        # Requeued holding its reserved token, so it runs without taking another
+        self.parked -= 1
+        self.queue_for(item[0]).put_nowait(item[:-1] + (True,))
+    
+    async def worker(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            priority, _, route, request, future, queued_at, reserved = item
+            if future.done():
+                # The caller gave up (e.g. timed out) before the request ran
+                if reserved:
+                    self.bucket(route).give_back()
+                continue
+            
+            if not reserved:
+                delay = self.bucket(route).take()
+                if delay:
+                    self.parked += 1
+                    loop.call_later(delay, self.unpark, item)
+                    continue
+            
+            waited = loop.time() - queued_at
+            stats = self.wait_stats[priority]
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+            try:
+                result = await request()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+    
+    def stats(self):
+        """Queue depth and per-priority wait times"""
+        return {
+            'queue_depth': self.queue.qsize() + self.prompt_queue.qsize() + self.parked,
+            'priorities': {
+                PRIORITY_NAMES[priority]: {
+                    'completed': count,
+                    'avg_wait_ms': (total / count * 1000) if count else 0.0,
+                    'max_wait_ms': peak * 1000
+                }
+                for priority, (count, total, peak) in self.wait_stats.items()
+            }
+        }
+
 class VerificationModal(discord.ui.Modal):
-    def __init__(self, bot, step: int):
+    def __init__(self, bot, questionnaire, step: int):
         self.bot = bot
+        self.questionnaire = questionnaire
         self.step = step
-        super().__init__(title=f"Question {step + 1} of {len(VERIFICATION_QUESTIONS)}")
+        super().__init__(title=f"Question {step + 1} of {len(questionnaire.questions)}")
         
-        # Add the question as a text input
+        # Add the question as a text input; labels are limited to 45 characters
+        question = questionnaire.questions[step]
         self.question_input = discord.ui.TextInput(
-            label=VERIFICATION_QUESTIONS[step],
+            label=question if len(question) <= 45 else question[:44] + '…',
             style=discord.TextStyle.paragraph,
             placeholder="Please provide a detailed answer...",
             required=True,
@@ -49,44 +1305,204 @@ class VerificationModal(discord.ui.Modal):
         """Handle modal submission"""
         try:
             user_id = interaction.user.id
+            started = time.perf_counter()
             
-            # Get user session
-            if user_id not in self.bot.verification_sessions:
+            async with self.bot.user_locks.hold(user_id):
+                # Get user session
+                session = self.bot.verification_sessions.get(user_id)
+                if session is None:
+                    await interaction.response.send_message(
+                        "❌ Session de vérification introuvable. Veuillez contacter un administrateur.",
+                        ephemeral=True
+                    )
+                    return
+                
+                # Ignore a modal for a question that was already answered
+                if session.step != self.step:
+                    await interaction.response.send_message(
+                        "✅ Cette question a déjà été répondue. Utilisez `/verify` pour continuer.",
+                        ephemeral=True
+                    )
+                    return
+                
+                # Store the answer
+                self.bot.metrics.inc('verifybot_events_total', event='modal_submit')
+                answer = self.question_input.value.strip()
+                session.answers.append(answer)
+                session.step += 1
+                # Any outstanding DM prompt is now for an answered question
+                session.awaiting_dm = False
+                session.prompt_step = None
+                self.bot.verification_sessions.put(session)
+                
+                # Check if more questions remain
+                if session.step < len(self.questionnaire.questions):
+                    embed = discord.Embed(
+                        title="✅ Réponse enregistrée!",
+                        description=f"Question {self.step + 1} répondu avec succès.\n\nUtilisez `/verify` à nouveau pour continuer avec la question {session.step + 1}.",
+                        color=0x00ff00
+                    )
+                    await interaction.response.send_message(embed=embed, ephemeral=True)
+                    self.bot.metrics.observe('verifybot_stage_seconds', time.perf_counter() - started, stage='modal_submit')
+                else:
+                    # All questions completed
+                    await interaction.response.send_message(
+                        "✅ Toutes les questions répondues! Traitement de votre vérification...",
+                        ephemeral=True
+                    )
+                    self.bot.metrics.observe('verifybot_stage_seconds', time.perf_counter() - started, stage='modal_submit')
+                    # Complete verification
+                    guild = interaction.guild
+                    await self.bot.complete_verification(interaction.user, guild)
+                
+        except Exception:
+            log.exception("Error in modal submission user=%s", interaction.user.id)
+            await interaction.response.send_message(
+                "❌ Une erreur est survenue lors de l'enregistrement de votre réponse. Veuillez réessayer.",
+                ephemeral=True
+            )
+
+class FullVerificationModal(discord.ui.Modal):
+    """Single modal asking every verification question at once"""
+    
+    def __init__(self, bot, questionnaire):
+        self.bot = bot
+        self.questionnaire = questionnaire
+        super().__init__(title=questionnaire.messages['modal_title'][:45])
+        
+        # Labels are limited to 45 characters, so the full question goes in the placeholder
+        self.question_inputs = []
+        for question in questionnaire.questions[:MODAL_MAX_INPUTS]:
+            question_input = discord.ui.TextInput(
+                label=question if len(question) <= 45 else question[:44] + '…',
+                style=discord.TextStyle.paragraph,
+                placeholder=question[:100],
+                required=True,
+                max_length=1000
+            )
+            self.question_inputs.append(question_input)
+            self.add_item(question_input)
+    
+    async def on_submit(self, interaction: discord.Interaction):
+        """Handle modal submission"""
+        try:
+            started = time.perf_counter()
+            async with self.bot.user_locks.hold(interaction.user.id):
+                session = self.bot.verification_sessions.get(interaction.user.id)
+                if session is None:
+                    await interaction.response.send_message(
+                        "❌ Session de vérification introuvable. Veuillez contacter un administrateur.",
+                        ephemeral=True
+                    )
+                    return
+                
+                # A second submission of the same form must not complete verification twice
+                if session.step >= len(self.questionnaire.questions):
+                    await interaction.response.send_message(
+                        "✅ Vous avez déjà complété toutes les questions de vérification!",
+                        ephemeral=True
+                    )
+                    return
+                
+                # Store every answer at once
+                self.bot.metrics.inc('verifybot_events_total', event='modal_submit')
+                session.answers = [question_input.value.strip() for question_input in self.question_inputs]
+                session.step = len(session.answers)
+                session.awaiting_dm = False
+                session.prompt_step = None
+                self.bot.verification_sessions.put(session)
+                
                 await interaction.response.send_message(
-                    "❌ Session de vérification introuvable. Veuillez contacter un administrateur.",
+                    "✅ Toutes les questions répondues! Traitement de votre vérification...",
                     ephemeral=True
                 )
+                self.bot.metrics.observe('verifybot_stage_seconds', time.perf_counter() - started, stage='modal_submit')
+                await self.bot.complete_verification(interaction.user, interaction.guild)
+                
+        except Exception:
+            log.exception("Error in modal submission user=%s", interaction.user.id)
+            await interaction.response.send_message(
+                "❌ Une erreur est survenue lors de l'enregistrement de vos réponses. Veuillez réessayer.",
+                ephemeral=True
+            )
+
+class VerificationStartView(discord.ui.View):
+    """Persistent button that opens the verification modal; survives restarts"""
+    
+    def __init__(self, bot):
+        super().__init__(timeout=None)
+        self.bot = bot
+    
+    @discord.ui.button(label="Commencer la vérification", emoji="✅",
+                       style=discord.ButtonStyle.success, custom_id="verification:start")
+    async def start_verification(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """Open the all-questions modal for the clicking member"""
+        try:
+            member = interaction.user
+            if interaction.guild is None:
                 return
             
-            session = self.bot.verification_sessions[user_id]
-            
-            # Store the answer
-            answer = self.question_input.value.strip()
-            session['answers'].append(answer)
-            session['step'] += 1
-            
-            # Check if more questions remain
-            if session['step'] < len(VERIFICATION_QUESTIONS):
-                embed = discord.Embed(
-                    title="✅ Réponse enregistrée!",
-                    description=f"Question {self.step + 1} répondu avec succès.\n\nUtilisez `/verify` à nouveau pour continuer avec la question {session['step'] + 1}.",
-                    color=0x00ff00
-                )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
-            else:
-                # All questions completed
+            if self.bot.draining:
                 await interaction.response.send_message(
-                    "✅ Toutes les questions répondues! Traitement de votre vérification...",
+                    "🔄 Le bot redémarre. Veuillez réessayer dans une minute.",
                     ephemeral=True
                 )
-                # Complete verification
-                guild = interaction.guild
-                await self.bot.complete_verification(interaction.user, guild)
+                return
             
-        except Exception as e:
-            print(f"Error in modal submission: {e}")
+            async with self.bot.user_locks.hold(member.id):
+                session = self.bot.verification_sessions.get(member.id)
+                if session is None:
+                    verified_role = self.bot.guild_index.verified_role(interaction.guild)
+                    if verified_role and verified_role in member.roles:
+                        await interaction.response.send_message(
+                            "✅ Vous êtes déjà vérifié!",
+                            ephemeral=True
+                        )
+                        return
+                    
+                    # Completed already; the role is queued and will be granted automatically
+                    if self.bot.pending_grants.has(interaction.guild.id, member.id):
+                        await interaction.response.send_message(
+                            "✅ Vos réponses ont déjà été reçues. Votre rôle vous sera attribué automatiquement.",
+                            ephemeral=True
+                        )
+                        return
+                    
+                    # Flagged answers are settled by an admin, not by answering again
+                    if self.bot.review_queue.is_held(interaction.guild.id, member.id):
+                        await interaction.response.send_message(
+                            "🕵️ Vos réponses sont en cours d'examen par un administrateur.",
+                            ephemeral=True
+                        )
+                        return
+                    
+                    # Members who joined before the bot was online can start from the button too
+                    session = VerificationSession(
+                        user_id=member.id,
+                        guild_id=interaction.guild.id,
+                        join_date=member.joined_at or datetime.now(timezone.utc)
+                    )
+                    self.bot.verification_sessions.put(session)
+                
+                questionnaire = self.bot.questionnaires.for_guild(interaction.guild.id)
+                if session.step >= len(questionnaire.questions):
+                    await interaction.response.send_message(
+                        "✅ Vous avez déjà complété toutes les questions de vérification!",
+                        ephemeral=True
+                    )
+                    return
+                
+                # A guild whose questions do not fit in one modal answers them one by one
+                if self.bot.flow_for(questionnaire) == 'modal':
+                    modal = FullVerificationModal(self.bot, questionnaire)
+                else:
+                    modal = VerificationModal(self.bot, questionnaire, session.step)
+                await interaction.response.send_modal(modal)
+                
+        except Exception:
+            log.exception("Error in verification button user=%s", interaction.user.id)
             await interaction.response.send_message(
-                "❌ Une erreur est survenue lors de l'enregistrement de votre réponse. Veuillez réessayer.",
+                "❌ Une erreur est survenue. Veuillez réessayer plus tard.",
                 ephemeral=True
             )
 
@@ -97,34 +1513,193 @@ class VerificationBot(commands.Bot):
         intents.message_content = True
         intents.members = True
         
+        # The bot's own member is always cached, even with an empty member cache
+        lean_options = {}
+        if LEAN_GATEWAY:
+            lean_options = {
+                'chunk_guilds_at_startup': False,
+                'member_cache_flags': discord.MemberCacheFlags.none()
+            }
+        
         super().__init__(
             command_prefix='!',
             intents=intents,
-            help_command=None
+            help_command=None,
+            **lean_options
         )
         
-        # Dictionary to store active verification sessions
-        # Format: {user_id: {'step': int, 'answers': [], 'guild_id': int, 'join_date': datetime}}
-        self.verification_sessions = {}
+        # Store of active verification sessions (see SESSION_STORE), keyed by user id
+        self.verification_sessions = create_session_store()
+        
+        # Member objects for users with a resident session; dropped when the LRU cap
+        # evicts the session and pruned by the janitor
+        self.session_members = {}
+        self.verification_sessions.on_evict = lambda session: self.session_members.pop(session.user_id, None)
+        
+        # Shared HTTP client for webhook delivery (created in setup_hook)
+        self.http_session = None
+        self.webhook_semaphore = None
+        
+        # Durable webhook outbox, drained by a background worker
+        self.outbox = None
+        self.outbox_wakeup = None
+        
+        # Questionnaire, channel and role names and embed templates per guild
+        self.questionnaires = QuestionnaireConfig()
+        
+        # Verification channel and Verified role ids per guild
+        self.guild_index = GuildIndex(self.questionnaires)
+        
+        # Members waiting for a coalesced welcome message, per guild id, and the
+        # tasks that send them
+        self.pending_welcomes = {}
+        self.welcome_tasks = set()
+        
+        # Default flow; see flow_for() for guilds whose questions do not fit in a modal
+        self.verification_flow = VERIFICATION_FLOW
+        self.start_view = VerificationStartView(self)
+        
+        # Stage latency metrics and counters, optionally served on /metrics
+        self.metrics = Metrics()
+        self.metrics.add_gauges(self.collect_gauges)
+        self.metrics_runner = None
+        
+        # Serializes each user's events (DMs, reactions, modals, button clicks)
+        # without a global lock
+        self.user_locks = KeyedLocks()
+        
+        # Priority scheduler for outbound Discord requests (workers start in setup_hook)
+        self.scheduler = OutboundScheduler()
+        
+        # Long-running tasks started in setup_hook and cancelled on close
+        self.background_tasks = []
+        self.startup_done = False
+        self.state = None
+        
+        # Commands defined on this class are bound to the bot instance
+        for command in (self.verify_command, self.backfill_command):
+            command.binding = self
+            self.tree.add_command(command)
+        
+        # Running backfill sweeps, per guild id
+        self.backfill_tasks = {}
+        
+        # Queued Verified role grants and their running retries, per guild id
+        self.pending_grants = None
+        self.grant_retry_tasks = {}
+        
+        # Spam screening ahead of completion, and where flagged members wait for an admin
+        self.spam_filter = SpamFilter() if SPAM_FILTER else None
+        self.review_queue = None
+        
+        # Graceful shutdown: set once a drain starts; joins during the drain get their
+        # welcome after the restart, and in-flight completions are awaited. Completions
+        # still running at the deadline are cancelled and their unfinished stages resumed
+        # after the restart
+        self.draining = False
+        self.shutdown_task = None
+        self.drain_cut = None
+        self.inflight_completions = set()
+        self.interrupted_completions = []
+        self.deferred_welcomes = []
+        self.webhook_stats = {'flushes': 0, 'items': 0, 'delivered': 0, 'failed': 0}
     
     async def setup_hook(self):
         """Called when the bot is starting up"""
-        print("Bot is starting up...")
-        # Sync slash commands
+        log.info("Bot is starting up")
+        
+        # One pooled, keep-alive client for every CRM push
+        connector = aiohttp.TCPConnector(
+            limit=WEBHOOK_MAX_CONCURRENCY,
+            keepalive_timeout=WEBHOOK_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=WEBHOOK_CONNECT_TIMEOUT,
+            sock_read=WEBHOOK_READ_TIMEOUT
+        )
+        self.http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self.webhook_semaphore = asyncio.Semaphore(WEBHOOK_MAX_CONCURRENCY)
+        
+        # Start draining the webhook outbox, including rows left over from a previous run
+        self.outbox = WebhookOutbox()
+        self.outbox_wakeup = asyncio.Event()
+        self.background_tasks.append(asyncio.create_task(self.outbox_worker()))
+        self.background_tasks.append(asyncio.create_task(self.session_janitor()))
+        self.background_tasks.extend(self.scheduler.start())
+        
+        # Re-attach the verification button to welcome messages sent before this restart
+        self.add_view(self.start_view)
+        
+        # Sessions snapshotted by the last clean shutdown (memory store only)
+        restored = self.verification_sessions.restore()
+        if restored:
+            log.info("Restored verification sessions count=%d", restored)
+        
+        # Drain instead of dying mid-verification when the platform stops the container
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(signum, self.request_shutdown)
+        
+        if METRICS_PORT:
+            await self.start_metrics_server()
+        
+        self.state = BotState()
+        self.pending_grants = PendingGrants()
+        self.review_queue = ReviewQueue()
+        self.background_tasks.append(asyncio.create_task(self.grant_retry_sweeper()))
+        self.background_tasks.append(asyncio.create_task(self.config_watcher()))
+        await self.sync_commands()
+    
+    def command_tree_hash(self, guild=None):
+        """Fingerprint of the command definitions Discord would receive on sync"""
+        payload = [command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)]
+        encoded = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+        return hashlib.sha256(encoded).hexdigest()
+    
+    async def sync_commands(self):
+        """Sync slash commands only when their definition changed since the last sync"""
+        if COMMAND_SYNC == 'off':
+            return
+        
+        guild = None
+        if DEV_GUILD_ID:
+            guild = discord.Object(id=DEV_GUILD_ID)
+            self.tree.copy_global_to(guild=guild)
+        
+        scope = f'guild:{DEV_GUILD_ID}' if guild else 'global'
+        key = f'command_hash:{self.application_id}:{scope}'
+        tree_hash = self.command_tree_hash(guild)
+        if COMMAND_SYNC != 'always' and self.state.get(key) == tree_hash:
+            log.info("Slash commands unchanged, skipping sync scope=%s", scope)
+            return
+        
         try:
-            synced = await self.tree.sync()
-            print(f"Synced {len(synced)} command(s)")
+            synced = await self.tree.sync(guild=guild)
+            self.state.set(key, tree_hash)
+            log.info("Synced commands count=%d scope=%s", len(synced), scope)
         except Exception as e:
-            print(f"Failed to sync commands: {e}")
+            log.error("Failed to sync commands: %s", e)
     
     async def on_ready(self):
-        """Called when the bot is ready"""
-        print(f'{self.user} has connected to Discord!')
-        print(f'Bot is in {len(self.guilds)} guild(s)')
+        """Called when the bot is ready; also fires again after the gateway reconnects"""
+        log.info("Connected to Discord user=%s guilds=%d", self.user, len(self.guilds))
         
-        # Print guild information for debugging
+        # Guilds are indexed lazily on first use, so nothing here blocks event handling
+        if not self.startup_done:
+            self.startup_done = True
+            self.background_tasks.append(asyncio.create_task(self.log_startup_diagnostics()))
+            self.background_tasks.append(asyncio.create_task(self.backfill_scheduler()))
+            self.background_tasks.append(asyncio.create_task(self.send_deferred_welcomes()))
+            self.background_tasks.append(asyncio.create_task(self.resume_completions()))
+    
+    async def log_startup_diagnostics(self):
+        """Warm the guild index and log the guild list and invite URL, off the ready path"""
         for guild in self.guilds:
-            print(f'- {guild.name} (ID: {guild.id})')
+            log.debug("Guild name=%s id=%s", guild.name, guild.id)
+            self.guild_index.build(guild)
+            await asyncio.sleep(0)
         
         # Generate proper bot invite URL with correct permissions
         permissions = discord.Permissions(
@@ -137,118 +1712,404 @@ class VerificationBot(commands.Bot):
         )
         
         invite_url = discord.utils.oauth_url(self.user.id, permissions=permissions, scopes=['bot', 'applications.commands'])
-        print(f"\n=== BOT INVITE URL WITH CORRECT PERMISSIONS ===")
-        print(f"If role assignment keeps failing, use this URL to re-invite the bot:")
-        print(f"{invite_url}")
-        print("=== END INVITE URL ===\n")
+        log.info("If role assignment keeps failing, re-invite the bot with this URL: %s", invite_url)
+    
+    async def start_metrics_server(self):
+        """Serve Prometheus metrics on METRICS_HOST:METRICS_PORT/metrics"""
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self.metrics_runner = web.AppRunner(app)
+        await self.metrics_runner.setup()
+        await web.TCPSite(self.metrics_runner, METRICS_HOST, METRICS_PORT).start()
+        log.info("Serving metrics on http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+    
+    async def handle_metrics(self, request):
+        return web.Response(
+            body=self.metrics.render().encode(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+    
+    def collect_gauges(self):
+        """Current session, outbox, scheduler and lock gauges for the metrics endpoint"""
+        session_stats = self.verification_sessions.stats()
+        yield 'verifybot_sessions_active', {}, session_stats['active']
+        yield 'verifybot_sessions_evicted_total', {}, session_stats['evicted']
+        yield 'verifybot_sessions_expired_total', {}, session_stats['expired']
+        yield 'verifybot_user_locks', {}, len(self.user_locks)
+        
+        if self.outbox:
+            counts = self.outbox.counts()
+            for status in ('pending', 'dead'):
+                yield 'verifybot_outbox_rows', {'status': status}, counts.get(status, 0)
+        if self.pending_grants:
+            yield 'verifybot_pending_role_grants', {}, self.pending_grants.count()
+        if self.review_queue:
+            yield 'verifybot_review_queue_pending', {}, self.review_queue.counts().get('pending', 0)
+        
+        scheduler_stats = self.scheduler.stats()
+        yield 'verifybot_scheduler_queue_depth', {}, scheduler_stats['queue_depth']
+        for priority, stats in scheduler_stats['priorities'].items():
+            yield 'verifybot_scheduler_avg_wait_seconds', {'priority': priority}, stats['avg_wait_ms'] / 1000
+            yield 'verifybot_scheduler_max_wait_seconds', {'priority': priority}, stats['max_wait_ms'] / 1000
+    
+    def request_shutdown(self):
+        """Signal handler: start a graceful drain, or cut the drain short on a second signal"""
+        if self.shutdown_task is None:
+            self.drain_cut = asyncio.Event()
+            self.shutdown_task = asyncio.create_task(self.drain_and_close())
+        elif not self.drain_cut.is_set():
+            log.warning("Second shutdown signal, stopping without waiting for the drain")
+            self.drain_cut.set()
+    
+    async def drain_and_close(self):
+        """Stop starting new verifications, let in-flight work finish within SHUTDOWN_DRAIN_TIMEOUT, then close"""
+        self.draining = True
+        log.info("Draining before shutdown completions=%d timeout=%ss",
+                 len(self.inflight_completions), SHUTDOWN_DRAIN_TIMEOUT)
+        
+        # Welcomes still inside their coalescing window are sent after the restart
+        for members in self.pending_welcomes.values():
+            self.deferred_welcomes.extend((member.guild.id, member.id) for member in members)
+        self.pending_welcomes.clear()
+        
+        drain = asyncio.create_task(self.drain())
+        cut = asyncio.create_task(self.drain_cut.wait())
+        try:
+            await asyncio.wait([drain, cut], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            drain.cancel()
+            cut.cancel()
+            await asyncio.wait([drain, cut])
+            # Shielded so nothing interrupts the snapshot or leaves the gateway open
+            await asyncio.shield(self.close())
+    
+    async def drain(self):
+        """Wait for in-flight completions and due CRM pushes, up to SHUTDOWN_DRAIN_TIMEOUT"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SHUTDOWN_DRAIN_TIMEOUT
+        try:
+            if self.inflight_completions:
+                await asyncio.wait(list(self.inflight_completions), timeout=max(0.0, deadline - loop.time()))
+            
+            # Push CRM rows that are due now; rows waiting on a retry backoff stay in the outbox
+            if self.outbox and self.outbox.due(limit=1):
+                self.outbox_wakeup.set()
+                while self.outbox.due(limit=1) and loop.time() < deadline:
+                    await asyncio.sleep(0.1)
+        finally:
+            log.info("Drain finished completions_left=%d outbox=%s",
+                     len(self.inflight_completions), self.outbox.counts() if self.outbox else {})
+    
+    async def resume_completions(self):
+        """Finish completions that the previous process cancelled at its shutdown deadline"""
+        value = self.state.get('interrupted_completions')
+        if not value:
+            return
+        self.state.delete('interrupted_completions')
+        
+        resumed = 0
+        for guild_id, user_id, stages in json.loads(value):
+            guild = self.get_guild(guild_id)
+            if guild is None:
+                continue
+            member = await self.resolve_member(guild, user_id)
+            if member is None:
+                continue
+            async with self.user_locks.hold(user_id):
+                if await self.complete_verification(member, guild, stages):
+                    resumed += 1
+        log.info("Resumed interrupted completions count=%d", resumed)
+    
+    async def send_deferred_welcomes(self):
+        """Welcome members who joined while the previous process was draining"""
+        value = self.state.get('deferred_welcomes')
+        if not value:
+            return
+        self.state.delete('deferred_welcomes')
+        
+        user_ids = {}
+        for guild_id, user_id in json.loads(value):
+            user_ids.setdefault(guild_id, []).append(user_id)
+        for guild_id, ids in user_ids.items():
+            guild = self.get_guild(guild_id)
+            if guild is None:
+                continue
+            members = []
+            for user_id in ids:
+                if user_id in self.verification_sessions:
+                    member = await self.resolve_member(guild, user_id)
+                    if member is not None:
+                        members.append(member)
+            for start in range(0, len(members), WELCOME_COALESCE_MAX):
+                await self.send_welcome(guild, members[start:start + WELCOME_COALESCE_MAX])
+            log.info("Sent deferred welcomes members=%d guild=%s", len(members), guild_id)
+    
+    async def close(self):
+        """Stop background tasks and close local resources before shutting down the gateway"""
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        # Stop completions that outlived the drain while the scheduler and stores still work
+        leftovers = list(self.inflight_completions)
+        for task in leftovers:
+            task.cancel()
+        await asyncio.gather(*leftovers, return_exceptions=True)
+        tasks = (self.background_tasks + list(self.backfill_tasks.values()) + list(self.grant_retry_tasks.values())
+                 + list(self.welcome_tasks))
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.outbox:
+            self.outbox.close()
+        if self.state:
+            if self.deferred_welcomes:
+                self.state.set('deferred_welcomes', json.dumps(self.deferred_welcomes))
+            if self.interrupted_completions:
+                self.state.set('interrupted_completions', json.dumps(self.interrupted_completions))
+            self.state.close()
+        if self.pending_grants:
+            self.pending_grants.close()
+        if self.review_queue:
+            self.review_queue.close()
+        if self.http_session and not self.http_session.closed:
+            await self.http_session.close()
+        snapshotted = self.verification_sessions.snapshot()
+        if snapshotted:
+            log.info("Saved verification sessions for the next start count=%d", snapshotted)
+        self.verification_sessions.close()
+        await super().close()
+    
+    def flow_for(self, questionnaire):
+        """The verification flow for a questionnaire; the modal flow needs every question in one modal"""
+        if self.verification_flow == 'modal' and len(questionnaire.questions) > MODAL_MAX_INPUTS:
+            return 'dm'
+        return self.verification_flow
+    
+    async def config_watcher(self):
+        """Background task that picks up questionnaire config changes without a restart"""
+        while True:
+            await asyncio.sleep(CONFIG_RELOAD_INTERVAL)
+            try:
+                if self.questionnaires.reload_if_changed():
+                    self.guild_index.reset()
+            except Exception:
+                log.exception("Error reloading questionnaire config")
+    
+    async def send_request(self, priority, route, request):
+        """Run an outbound Discord request through the priority scheduler"""
+        return await self.scheduler.submit(priority, route, request)
+    
+    async def on_guild_join(self, guild):
+        """Index a guild the bot was just added to"""
+        self.guild_index.build(guild)
+    
+    async def on_guild_remove(self, guild):
+        """Drop a guild the bot was removed from"""
+        self.guild_index.forget(guild)
+    
+    # Keep the guild index current as channels and roles change
+    
+    async def on_guild_channel_create(self, channel):
+        self.guild_index.channel_changed(channel.guild, channel)
+    
+    async def on_guild_channel_update(self, before, after):
+        self.guild_index.channel_changed(after.guild, before, after)
+    
+    async def on_guild_channel_delete(self, channel):
+        self.guild_index.channel_changed(channel.guild, channel)
+    
+    async def on_guild_role_create(self, role):
+        self.guild_index.role_changed(role.guild, role)
+        self.schedule_grant_retry(role.guild)
+    
+    async def on_guild_role_update(self, before, after):
+        self.guild_index.role_changed(after.guild, before, after)
+        # Moving the bot's role or granting it Manage Roles may unblock queued grants
+        self.schedule_grant_retry(after.guild)
+    
+    async def on_member_update(self, before, after):
+        """Retry queued grants when the bot itself is given new roles"""
+        if after.id == self.user.id and before.roles != after.roles:
+            self.schedule_grant_retry(after.guild)
+    
+    async def on_guild_role_delete(self, role):
+        self.guild_index.role_changed(role.guild, role)
+    
+    async def session_janitor(self):
+        """Background task that expires abandoned verification sessions"""
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+            try:
+                expired = self.verification_sessions.expire()
+                resident = self.verification_sessions.resident
+                for user_id in [user_id for user_id in self.session_members if user_id not in resident]:
+                    del self.session_members[user_id]
+                if expired:
+                    stats = self.verification_sessions.stats()
+                    log.info("Expired verification sessions count=%d active=%d evicted_total=%d expired_total=%d",
+                             expired, stats['active'], stats['evicted'], stats['expired'])
+            except Exception:
+                log.exception("Error expiring verification sessions")
     
     async def on_member_join(self, member):
         """Called when a new member joins the server"""
         try:
-            print(f"New member joined: {member.name} (ID: {member.id})")
+            log.info("Member joined user=%s guild=%s", member.id, member.guild.id)
+            self.metrics.inc('verifybot_events_total', event='member_join')
             
             # Clear any existing verification session for this user
             if member.id in self.verification_sessions:
-                print(f"Clearing existing verification session for {member}")
-                del self.verification_sessions[member.id]
+                log.debug("Clearing existing verification session user=%s", member.id)
+                self.verification_sessions.delete(member.id)
             
             # Initialize verification session
-            self.verification_sessions[member.id] = {
-                'step': 0,
-                'answers': [],
-                'guild_id': member.guild.id,
-                'join_date': member.joined_at or datetime.now(timezone.utc)
-            }
+            session = VerificationSession(
+                user_id=member.id,
+                guild_id=member.guild.id,
+                join_date=member.joined_at or datetime.now(timezone.utc)
+            )
+            self.verification_sessions.put(session)
+            self.session_members[member.id] = member
+            
+            if self.draining:
+                self.deferred_welcomes.append((member.guild.id, member.id))
+            elif WELCOME_COALESCE_WINDOW > 0:
+                self.queue_welcome(member)
+            else:
+                await self.send_welcome(member.guild, [member])
             
+        except Exception:
+            log.exception("Error in on_member_join user=%s", member.id)
+    
+    def queue_welcome(self, member):
+        """Add a member to the guild's pending welcome, flushed after WELCOME_COALESCE_WINDOW"""
+        pending = self.pending_welcomes.setdefault(member.guild.id, [])
+        pending.append(member)
+        if len(pending) >= WELCOME_COALESCE_MAX:
+            # Full: send right away; later joins start a new window
+            del self.pending_welcomes[member.guild.id]
+            self.track_welcome(self.send_welcome(member.guild, pending))
+        elif len(pending) == 1:
+            self.track_welcome(self.flush_welcome_later(member.guild, pending))
+    
+    def track_welcome(self, coro):
+        """Run a welcome send as a task that is kept referenced and cancelled on close"""
+        task = asyncio.create_task(coro)
+        self.welcome_tasks.add(task)
+        task.add_done_callback(self.welcome_tasks.discard)
+    
+    async def flush_welcome_later(self, guild, pending):
+        """Send a coalesced welcome once its window closes, unless it was already sent"""
+        await asyncio.sleep(WELCOME_COALESCE_WINDOW)
+        if self.pending_welcomes.get(guild.id) is pending:
+            del self.pending_welcomes[guild.id]
+            await self.send_welcome(guild, pending)
+    
+    async def send_welcome(self, guild, members, priority=PRIORITY_WELCOME):
+        """Send one welcome message with a ✅ reaction for one or more new members"""
+        try:
             # Find the verification channel
-            verify_channel = discord.utils.get(member.guild.channels, name=VERIFY_CHANNEL_NAME)
+            questionnaire = self.questionnaires.for_guild(guild.id)
+            verify_channel = self.guild_index.verify_channel(guild)
             if not verify_channel:
-                print(f"Error: #{VERIFY_CHANNEL_NAME} channel not found in {member.guild.name}")
+                log.error("Verification channel #%s not found guild=%s", questionnaire.channel_name, guild.id)
                 return
             
             # Send verification message in the designated channel
-            embed = discord.Embed(
-                title="🎉 Bienvenue dans la communauté Amazon FBA!",
-                description=f"Hey {member.mention}! Pour obtenir la vérification et accéder à tous les canaux, veuillez réagir avec ✅ à ce message pour démarrer le processus de vérification.",
-                color=0x00ff00
-            )
-            embed.add_field(
-                name="📝 Ce qui se passe ensuite:",
-                value="• Réagissez avec ✅ ci-dessous pour démarrer\n• Répondez à 4 questions Amazon FBA en privé\n• Obtenez votre rôle Vérifié automatiquement",
-                inline=False
-            )
-            embed.set_footer(text=f"Bienvenue {member.display_name}!")
+            mentions = ' '.join(member.mention for member in members)
+            flow = self.flow_for(questionnaire)
+            embed = questionnaire.embed('welcome_button' if flow == 'modal' else 'welcome_reaction', mentions=mentions)
+            embed.set_footer(text=questionnaire.welcome_footer(members))
             
-            # Send the message and add reaction
-            verification_msg = await verify_channel.send(f"{member.mention}", embed=embed)
-            await verification_msg.add_reaction('✅')
-            print(f"Sent welcome message to {member} in {verify_channel.name}")
+            # Send the message with the verification button, or add the reaction
+            route = ('channel', verify_channel.id)
+            if flow == 'modal':
+                verification_msg = await self.send_request(
+                    priority, route, lambda: verify_channel.send(mentions, embed=embed, view=self.start_view)
+                )
+            else:
+                verification_msg = await self.send_request(
+                    priority, route, lambda: verify_channel.send(mentions, embed=embed)
+                )
+                # Discord limits reactions separately from messages, so they get their own bucket
+                await self.send_request(priority, ('reaction', verify_channel.id), lambda: verification_msg.add_reaction('✅'))
+            log.info("Sent welcome message members=%d guild=%s", len(members), guild.id)
             
-            # Store the message ID for this user's verification
-            self.verification_sessions[member.id]['message_id'] = verification_msg.id
+            # Backfilled members joined long before their welcome; keep them out of the join latency
+            if priority == PRIORITY_WELCOME:
+                now = datetime.now(timezone.utc)
+                for member in members:
+                    joined_at = member.joined_at or now
+                    self.metrics.observe('verifybot_stage_seconds', max(0.0, (now - joined_at).total_seconds()),
+                                         stage='join_to_welcome')
             
-        except Exception as e:
-            print(f"Error in on_member_join: {e}")
+            # Store the message ID for each welcomed user's verification
+            for member in members:
+                session = self.verification_sessions.get(member.id)
+                if session is not None:
+                    session.message_id = verification_msg.id
+                    self.verification_sessions.put(session)
+            
+        except Exception:
+            log.exception("Error sending welcome message guild=%s", guild.id)
     
-    async def on_reaction_add(self, reaction, user):
-        """Handle reaction-based verification trigger"""
+    async def on_raw_reaction_add(self, payload):
+        """Handle reaction-based verification trigger, independent of the message cache"""
         try:
-            # Ignore bot reactions
-            if user.bot:
+            # Only the member a welcome message was sent to can start verification from it
+            if not self.verification_sessions.is_welcome_for(payload.message_id, payload.user_id):
                 return
             
-            # Check if reaction is in verification channel
-            if reaction.message.channel.name != VERIFY_CHANNEL_NAME:
+            # No new verifications while shutting down; the member can react again after the restart
+            if self.draining:
                 return
             
             # Check if it's the correct reaction
-            if str(reaction.emoji) != '✅':
-                return
-            
-            # Check if user has an active verification session
-            if user.id not in self.verification_sessions:
+            if str(payload.emoji) != '✅':
                 return
             
-            session = self.verification_sessions[user.id]
+            started = time.perf_counter()
+            self.metrics.inc('verifybot_events_total', event='reaction_trigger')
             
-            # Check if this is their verification message
-            if reaction.message.id != session.get('message_id'):
+            # Ignore bot reactions
+            if payload.member is not None and payload.member.bot:
                 return
             
-            # Start the verification process with first question
-            current_step = session['step']
-            if current_step < len(VERIFICATION_QUESTIONS):
-                modal = VerificationModal(self, current_step)
+            async with self.user_locks.hold(payload.user_id):
+                # Check if user has an active verification session for this message
+                session = self.verification_sessions.get(payload.user_id)
+                if session is None or session.message_id != payload.message_id:
+                    return
                 
-                # Create a temporary interaction-like object for the modal
-                # Since we can't send modals from reaction events, we'll send a DM instead
-                try:
-                    embed = discord.Embed(
-                        title=f"Question {current_step + 1} of {len(VERIFICATION_QUESTIONS)}",
-                        description=f"**{VERIFICATION_QUESTIONS[current_step]}**",
-                        color=0x3498db
-                    )
-                    embed.add_field(
-                        name="📝 Comment répondre:",
-                        value="Veuillez répondre à ce DM avec votre réponse. Votre réponse sera privée.",
-                        inline=False
-                    )
-                    await user.send(embed=embed)
-                    
-                    # Update session to indicate we're waiting for DM response
-                    session['awaiting_dm'] = True
+                # Start the verification process with first question
+                current_step = session.step
+                questionnaire = self.questionnaires.for_guild(session.guild_id)
+                if current_step < len(questionnaire.questions):
+                    user = payload.member or self.get_user(payload.user_id) or await self.fetch_user(payload.user_id)
                     
-                except discord.Forbidden:
-                    # If DM fails, send ephemeral message in channel
-                    embed = discord.Embed(
-                        title="⚠️ DM requis",
-                        description=f"{user.mention} Veuillez activer les DM des membres du serveur pour compléter la vérification, ou contactez un administrateur pour de l'aide.",
-                        color=0xff9900
-                    )
-                    await reaction.message.channel.send(embed=embed, delete_after=10)
-            
-        except Exception as e:
-            print(f"Error in reaction handler: {e}")
+                    # Since we can't send modals from reaction events, we'll send a DM instead
+                    try:
+                        embed = questionnaire.question_embed(current_step)
+                        await self.send_request(PRIORITY_PROMPT, ('dm', user.id), lambda: user.send(embed=embed))
+                        self.metrics.observe('verifybot_stage_seconds', time.perf_counter() - started,
+                                             stage='reaction_to_prompt')
+                        
+                        # Update session to indicate we're waiting for DM response
+                        session.awaiting_dm = True
+                        session.prompt_step = current_step
+                        self.verification_sessions.put(session)
+                        
+                    except discord.Forbidden:
+                        # If DM fails, send ephemeral message in channel
+                        embed = questionnaire.embed('dm_required', member=user.mention)
+                        channel = self.get_channel(payload.channel_id)
+                        if channel:
+                            await self.send_request(
+                                PRIORITY_WELCOME, ('channel', channel.id),
+                                lambda: channel.send(embed=embed, delete_after=10)
+                            )
+                
+        except Exception:
+            log.exception("Error in reaction handler user=%s", payload.user_id)
     
     async def on_message(self, message):
         """Handle DM responses for verification"""
@@ -262,61 +2123,74 @@ class VerificationBot(commands.Bot):
                 return
             
             user_id = message.author.id
+            started = time.perf_counter()
             
-            # Check if user has an active verification session
-            if user_id not in self.verification_sessions:
-                return
-            
-            session = self.verification_sessions[user_id]
-            
-            # Check if we're waiting for a DM response
-            if not session.get('awaiting_dm'):
-                return
-            
-            # Store the answer
-            answer = message.content.strip()
-            session['answers'].append(answer)
-            session['step'] += 1
-            session['awaiting_dm'] = False
-            
-            # Send confirmation
-            await message.add_reaction('✅')
-            
-            # Check if more questions remain
-            if session['step'] < len(VERIFICATION_QUESTIONS):
-                # Send next question
-                embed = discord.Embed(
-                    title=f"Question {session['step'] + 1} of {len(VERIFICATION_QUESTIONS)}",
-                    description=f"**{VERIFICATION_QUESTIONS[session['step']]}**",
-                    color=0x3498db
-                )
-                embed.add_field(
-                    name="📝 Comment répondre:",
-                    value="Veuillez répondre à ce DM avec votre réponse. Votre réponse sera privée.",
-                    inline=False
-                )
-                await message.author.send(embed=embed)
-                session['awaiting_dm'] = True
-            else:
-                # All questions completed
-                completion_embed = discord.Embed(
-                    title="✅ Toutes les questions répondues!",
-                    description="Traitement de votre vérification...",
-                    color=0x00ff00
-                )
-                await message.author.send(embed=completion_embed)
+            async with self.user_locks.hold(user_id):
+                # Check if user has an active verification session
+                session = self.verification_sessions.get(user_id)
+                if session is None:
+                    return
+                
+                # Check if we're waiting for a DM response
+                if not session.awaiting_dm:
+                    return
+                
+                route = ('dm', user_id)
+                questionnaire = self.questionnaires.for_guild(session.guild_id)
                 
-                # Complete verification
-                guild = self.get_guild(session['guild_id'])
-                if guild:
-                    member = guild.get_member(message.author.id)
-                    if member:
-                        await self.complete_verification(member, guild)
+                # The prompt was for a question since answered through /verify: re-prompt
+                # with the current question instead of filing the reply under it
+                if session.prompt_step != session.step:
+                    if session.step < len(questionnaire.questions):
+                        embed = questionnaire.question_embed(session.step)
+                        await self.send_request(PRIORITY_PROMPT, route, lambda: message.author.send(embed=embed))
+                        session.prompt_step = session.step
                     else:
-                        print(f"Could not find member {message.author} in guild {guild.name}")
-            
-        except Exception as e:
-            print(f"Error processing DM: {e}")
+                        session.awaiting_dm = False
+                        session.prompt_step = None
+                    self.verification_sessions.put(session)
+                    return
+                
+                # Store the answer
+                self.metrics.inc('verifybot_events_total', event='dm_answer')
+                answer = message.content.strip()
+                session.answers.append(answer)
+                session.step += 1
+                session.awaiting_dm = False
+                session.prompt_step = None
+                self.verification_sessions.put(session)
+                
+                # Check if more questions remain
+                if session.step < len(questionnaire.questions):
+                    # Send next question
+                    embed = questionnaire.question_embed(session.step)
+                    await self.send_request(PRIORITY_PROMPT, route, lambda: message.author.send(embed=embed))
+                    self.metrics.observe('verifybot_stage_seconds', time.perf_counter() - started, stage='dm_answer')
+                    session.awaiting_dm = True
+                    session.prompt_step = session.step
+                    self.verification_sessions.put(session)
+                    
+                    # Send confirmation after the next prompt so the prompt is never delayed
+                    await self.send_request(PRIORITY_COMPLETION, route, lambda: message.add_reaction('✅'))
+                else:
+                    # Send confirmation
+                    await self.send_request(PRIORITY_COMPLETION, route, lambda: message.add_reaction('✅'))
+                    
+                    # All questions completed
+                    completion_embed = questionnaire.embed('answers_done')
+                    await self.send_request(PRIORITY_COMPLETION, route, lambda: message.author.send(embed=completion_embed))
+                    
+                    # Complete verification
+                    guild = self.get_guild(session.guild_id)
+                    if guild:
+                        member = await self.resolve_member(guild, message.author.id)
+                        if member:
+                            await self.complete_verification(member, guild)
+                        else:
+                            log.warning("Could not find member user=%s guild=%s", message.author.id, guild.id)
+                
+        except Exception:
+            log.exception("Error processing DM user=%s", message.author.id)
 
     @app_commands.command(name="verify", description="Start the Amazon FBA verification process")
     async def verify_command(self, interaction: discord.Interaction):
@@ -324,8 +2198,16 @@ class VerificationBot(commands.Bot):
         try:
             user_id = interaction.user.id
             
+            if self.draining:
+                await interaction.response.send_message(
+                    "🔄 Le bot redémarre. Veuillez réessayer dans une minute.",
+                    ephemeral=True
+                )
+                return
+            
             # Check if user has an active verification session
-            if user_id not in self.verification_sessions:
+            session = self.verification_sessions.get(user_id)
+            if session is None:
                 await interaction.response.send_message(
                     "❌ Vous n'avez pas de session de vérification active. Cela peut être dû à:\n"
                     "• Vous avez déjà complété la vérification\n"
@@ -336,212 +2218,693 @@ class VerificationBot(commands.Bot):
                 )
                 return
             
-            session = self.verification_sessions[user_id]
-            current_step = session['step']
+            current_step = session.step
+            questionnaire = self.questionnaires.for_guild(session.guild_id)
             
-            if current_step >= len(VERIFICATION_QUESTIONS):
+            if current_step >= len(questionnaire.questions):
                 await interaction.response.send_message(
                     "✅ Vous avez déjà complété toutes les questions de vérification!",
                     ephemeral=True
                 )
                 return
             
-            # Create and send the modal for the current question
-            modal = VerificationModal(self, current_step)
+            # Create and send the modal for the current question, or all of them
+            if self.flow_for(questionnaire) == 'modal':
+                modal = FullVerificationModal(self, questionnaire)
+            else:
+                modal = VerificationModal(self, questionnaire, current_step)
             await interaction.response.send_modal(modal)
             
-        except Exception as e:
-            print(f"Error in verify command: {e}")
+        except Exception:
+            log.exception("Error in verify command user=%s", interaction.user.id)
             await interaction.response.send_message(
                 "❌ Une erreur est survenue. Veuillez réessayer plus tard.",
                 ephemeral=True
             )
     
-    async def complete_verification(self, member, guild):
-        """Complete the verification process"""
+    async def resolve_member(self, guild, user_id):
+        """Find a guild member from the cache, the session members, or the API"""
+        member = guild.get_member(user_id)
+        if member is None:
+            member = self.session_members.get(user_id)
+        if member is not None and member.guild.id == guild.id:
+            return member
+        
+        try:
+            member = await self.send_request(PRIORITY_COMPLETION, ('guild', guild.id), lambda: guild.fetch_member(user_id))
+        except discord.NotFound:
+            return None
+        self.session_members[user_id] = member
+        return member
+    
+    @app_commands.command(name="backfill", description="Welcome members who joined while the bot was offline")
+    @app_commands.describe(restart="Start over from the first member instead of resuming")
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.guild_only()
+    async def backfill_command(self, interaction: discord.Interaction, restart: bool = False):
+        """Admin slash command to start or resume the backfill sweep for this guild"""
+        if self.draining:
+            message = "🔄 Le bot redémarre. Veuillez réessayer dans une minute."
+        elif self.start_backfill(interaction.guild, restart=restart):
+            message = "🔄 Recherche des membres non vérifiés lancée en arrière-plan."
+        else:
+            progress = self.backfill_progress(interaction.guild.id) or {}
+            message = (f"⏳ Une recherche est déjà en cours ({progress.get('scanned', 0)} membres parcourus, "
+                       f"{progress.get('queued', 0)} sessions créées).")
+        await interaction.response.send_message(message, ephemeral=True)
+    
+    def backfill_progress(self, guild_id):
+        """Checkpoint of an unfinished backfill sweep, or None"""
+        value = self.state.get(f'backfill:{guild_id}')
+        return json.loads(value) if value else None
+    
+    def start_backfill(self, guild, restart=False, scheduled=False):
+        """Start a background backfill sweep for a guild; False if one is already running"""
+        task = self.backfill_tasks.get(guild.id)
+        if task is not None and not task.done():
+            return False
+        if restart:
+            self.state.delete(f'backfill:{guild.id}')
+        self.backfill_tasks[guild.id] = asyncio.create_task(self.backfill_guild(guild, scheduled))
+        return True
+    
+    async def backfill_scheduler(self):
+        """Resume interrupted sweeps at startup, then sweep every guild periodically"""
+        for key in self.state.keys('backfill:'):
+            guild = self.get_guild(int(key.split(':', 1)[1]))
+            if guild is not None:
+                log.info("Resuming backfill guild=%s", guild.id)
+                self.start_backfill(guild)
+        
+        if BACKFILL_INTERVAL_HOURS <= 0:
+            return
+        while True:
+            await asyncio.sleep(BACKFILL_INTERVAL_HOURS * 3600)
+            for guild in self.guilds:
+                self.start_backfill(guild, scheduled=True)
+    
+    async def fetch_member_page(self, guild, after):
+        """One page of guild members with ids above `after`, in id order"""
+        return [member async for member in guild.fetch_members(limit=BACKFILL_PAGE_SIZE, after=discord.Object(id=after))]
+    
+    async def backfill_guild(self, guild, scheduled=False):
+        """Page through the guild's members, creating sessions for unverified members without one.
+        
+        The last member id of each page is checkpointed, so a restart resumes where it stopped.
+        Pages and welcome messages go through the scheduler at the lowest priority, so live
+        joins are never held up behind a sweep. Every member a sweep welcomes is recorded, and
+        scheduled sweeps skip them so lurkers are not mentioned again each time their session expires.
+        """
+        key = f'backfill:{guild.id}'
+        progress = self.backfill_progress(guild.id) or {'after': 0, 'scanned': 0, 'queued': 0, 'scheduled': scheduled}
+        cutoff = None
+        if BACKFILL_MAX_AGE_DAYS > 0:
+            cutoff = datetime.now(timezone.utc).timestamp() - BACKFILL_MAX_AGE_DAYS * 86400
+        log.info("Backfill started guild=%s after=%s", guild.id, progress['after'])
+        
+        try:
+            while True:
+                page = await self.send_request(
+                    PRIORITY_BACKFILL, ('members', guild.id), lambda: self.fetch_member_page(guild, progress['after'])
+                )
+                if not page:
+                    break
+                
+                verified_role = self.guild_index.verified_role(guild)
+                recruits = []
+                for member in page:
+                    if member.bot or (verified_role is not None and member.get_role(verified_role.id)):
+                        continue
+                    if cutoff is not None and member.joined_at and member.joined_at.timestamp() < cutoff:
+                        continue
+                    if member.id in self.verification_sessions or self.pending_grants.has(guild.id, member.id):
+                        continue
+                    if self.review_queue.is_held(guild.id, member.id):
+                        continue
+                    welcomed_key = f'backfill_welcomed:{guild.id}:{member.id}'
+                    if progress.get('scheduled') and self.state.get(welcomed_key):
+                        continue
+                    self.verification_sessions.put(VerificationSession(
+                        user_id=member.id,
+                        guild_id=guild.id,
+                        join_date=member.joined_at or datetime.now(timezone.utc)
+                    ))
+                    self.session_members[member.id] = member
+                    self.state.set(welcomed_key, str(int(time.time())))
+                    recruits.append(member)
+                
+                for start in range(0, len(recruits), WELCOME_COALESCE_MAX):
+                    await self.send_welcome(guild, recruits[start:start + WELCOME_COALESCE_MAX], PRIORITY_BACKFILL)
+                
+                progress['after'] = max(member.id for member in page)
+                progress['scanned'] += len(page)
+                progress['queued'] += len(recruits)
+                self.state.set(key, json.dumps(progress))
+                self.metrics.inc('verifybot_backfill_members_total', len(recruits))
+                if len(page) < BACKFILL_PAGE_SIZE:
+                    break
+            
+            self.state.delete(key)
+            log.info("Backfill finished guild=%s scanned=%d queued=%d", guild.id, progress['scanned'], progress['queued'])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Backfill failed guild=%s, will resume from after=%s", guild.id, progress['after'])
+    
+    async def complete_verification(self, member, guild, stages=None):
+        """Complete the verification process.
+        
+        Role grant, confirmation DM and CRM push run concurrently, each under
+        its own timeout, so a slow DM or CRM call never holds up the role. The
+        DM waits for the role, since a queued grant is confirmed by retry_grant.
+        Returns one StageResult per stage. `stages` limits the run to the named
+        stages when resuming a completion that a shutdown cut short.
+        """
+        task = asyncio.current_task()
+        self.inflight_completions.add(task)
+        resuming = stages is not None
+        stages = stages or ['role', 'dm', 'crm']
+        running = {}
         try:
             session = self.verification_sessions.get(member.id)
             if not session:
-                return
+                return []
+            
+            self.metrics.inc('verifybot_events_total', event='completion')
+            # A resumed completion was screened before the shutdown
+            if not resuming and await self.hold_for_review(member, guild, session):
+                return []
             
-            # Debug: Print bot permissions and role info
-            bot_member = guild.get_member(self.user.id)
-            if bot_member:
-                print(f"Bot permissions: manage_roles={bot_member.guild_permissions.manage_roles}, administrator={bot_member.guild_permissions.administrator}")
-                print(f"Bot top role: {bot_member.top_role.name} (position: {bot_member.top_role.position})")
+            started = time.perf_counter()
+            calls = {
+                'role': (lambda: self.grant_verified_role(member, guild), COMPLETION_ROLE_TIMEOUT),
+                'dm': (lambda: self.send_completion_dm(member), COMPLETION_DM_TIMEOUT),
+                'crm': (lambda: self.send_to_webhook(member, session), COMPLETION_CRM_TIMEOUT)
+            }
+            for name in stages:
+                if name == 'dm' and 'role' in running:
+                    running[name] = asyncio.create_task(self.confirm_after_grant(member, running['role']))
+                    continue
+                call, timeout = calls[name]
+                running[name] = asyncio.create_task(self.run_stage(name, call(), timeout))
+            results = await asyncio.gather(*running.values())
+            self.metrics.observe('verifybot_stage_seconds', time.perf_counter() - started, stage='completion')
+            log.info("Completed verification user=%s stages=[%s]", member.id, ', '.join(str(result) for result in results))
             
-            # Find and assign the verified role
-            verified_role = discord.utils.get(guild.roles, name=VERIFIED_ROLE_NAME)
+            # A role stage that timed out or could not create the role is retried later too
+            for result in results:
+                if result.name == 'role' and not result.ok:
+                    self.pending_grants.add(guild.id, member.id, result.error)
             
-            if not verified_role:
-                print(f"Error: '{VERIFIED_ROLE_NAME}' role not found in {guild.name}")
-                # Create the role if it doesn't exist - place it at the bottom
-                try:
-                    verified_role = await guild.create_role(
-                        name=VERIFIED_ROLE_NAME,
+            # Clean up the session
+            self.verification_sessions.delete(member.id)
+            self.session_members.pop(member.id, None)
+            return results
+            
+        except asyncio.CancelledError:
+            # Cancelled at shutdown: keep the session and resume what did not finish after the restart
+            unfinished = [name for name in stages if name not in running or running[name].cancelled()
+                          or not running[name].done() or not running[name].result().ok]
+            if unfinished:
+                self.interrupted_completions.append((guild.id, member.id, unfinished))
+            raise
+        except Exception:
+            log.exception("Error completing verification user=%s", member.id)
+            return []
+        finally:
+            self.inflight_completions.discard(task)
+    
+    async def hold_for_review(self, member, guild, session):
+        """Screen the answers; flagged members go to the review queue instead of completing"""
+        if self.spam_filter is None:
+            return False
+        reasons = self.spam_filter.check(session)
+        if not reasons:
+            return False
+        
+        self.review_queue.add(guild.id, member.id, self.build_webhook_payload(member, session), reasons)
+        self.verification_sessions.delete(member.id)
+        self.session_members.pop(member.id, None)
+        for reason in reasons:
+            self.metrics.inc('verifybot_spam_flagged_total', reason=reason)
+        log.warning("Verification held for review user=%s guild=%s reasons=%s", member.id, guild.id, ','.join(reasons))
+        
+        try:
+            embed = self.questionnaires.for_guild(guild.id).embed('under_review')
+            await self.send_request(PRIORITY_COMPLETION, ('dm', member.id), lambda: member.send(embed=embed))
+        except discord.HTTPException:
+            log.info("Could not send DM user=%s (DMs might be disabled)", member.id)
+        return True
+    
+    async def run_stage(self, name, stage, timeout):
+        """Await one completion stage under a timeout and record its outcome"""
+        started = time.perf_counter()
+        try:
+            ok = await asyncio.wait_for(stage, timeout=timeout)
+            result = StageResult(name, ok is not False, time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            result = StageResult(name, False, time.perf_counter() - started, f"timed out after {timeout}s")
+        except Exception as e:
+            result = StageResult(name, False, time.perf_counter() - started, str(e))
+        
+        self.metrics.observe('verifybot_stage_seconds', result.duration, stage=f'completion_{name}')
+        self.metrics.inc('verifybot_completion_stages_total', stage=name, result='ok' if result.ok else 'failed')
+        return result
+    
+    async def grant_verified_role(self, member, guild):
+        """Give the member the Verified role, notifying admins if it cannot be assigned"""
+        # Debug: Print bot permissions and role info
+        bot_member = guild.me
+        if bot_member:
+            log.debug("Bot permissions manage_roles=%s administrator=%s top_role=%s position=%d",
+                      bot_member.guild_permissions.manage_roles, bot_member.guild_permissions.administrator,
+                      bot_member.top_role.name, bot_member.top_role.position)
+        
+        # Find and assign the verified role
+        questionnaire = self.questionnaires.for_guild(guild.id)
+        role_name = questionnaire.role_name
+        verified_role = self.guild_index.verified_role(guild)
+        
+        if not verified_role:
+            log.warning("Role '%s' not found guild=%s", role_name, guild.id)
+            # Create the role if it doesn't exist - place it at the bottom
+            try:
+                verified_role = await self.send_request(
+                    PRIORITY_COMPLETION, ('guild', guild.id),
+                    lambda: guild.create_role(
+                        name=role_name,
                         color=discord.Color.green(),
                         reason="Verification bot role creation"
                     )
-                    print(f"Created '{VERIFIED_ROLE_NAME}' role in {guild.name} at position {verified_role.position}")
-                    
-                    # Try to move the verified role below the bot role
-                    bot_member = guild.get_member(self.user.id)
-                    if bot_member and bot_member.top_role.position > 1:
-                        try:
-                            await verified_role.edit(position=bot_member.top_role.position - 1)
-                            print(f"Moved Verified role to position {verified_role.position}")
-                        except Exception as e:
-                            print(f"Failed to move verified role position: {e}")
-                            
-                except Exception as e:
-                    print(f"Failed to create verified role: {e}")
-                    return
-            else:
-                print(f"Found '{VERIFIED_ROLE_NAME}' role at position {verified_role.position}")
-            
-            # Debug: Check role hierarchy (lower position number = higher in hierarchy)
-            if bot_member and verified_role.position >= bot_member.top_role.position:
-                print(f"Role hierarchy issue: Bot role position {bot_member.top_role.position} needs to be LOWER than Verified role position {verified_role.position}")
-                print("The bot role needs to be moved HIGHER in the Discord server role list")
-            
-            print(f"Attempting to assign '{VERIFIED_ROLE_NAME}' role to {member.name}")
-            print(f"Member current roles: {[role.name for role in member.roles]}")
-            
-            # Check if user already has the role
-            if verified_role in member.roles:
-                print(f"{member} already has the {VERIFIED_ROLE_NAME} role")
-            else:
-                # Try multiple methods to assign the role
-                role_assigned = False
-                
-                # Method 1: Direct role assignment
-                try:
-                    await member.add_roles(verified_role, reason="Completed verification process")
-                    print(f"Successfully assigned {VERIFIED_ROLE_NAME} role to {member}")
-                    role_assigned = True
-                except discord.Forbidden as e:
-                    print(f"Method 1 failed - Missing permissions: {e}")
-                except Exception as e:
-                    print(f"Method 1 failed - Error: {e}")
-                
-                # Method 2: Try editing member roles directly
-                if not role_assigned:
-                    try:
-                        new_roles = list(member.roles) + [verified_role]
-                        await member.edit(roles=new_roles, reason="Completed verification process")
-                        print(f"Successfully assigned {VERIFIED_ROLE_NAME} role to {member} via edit method")
-                        role_assigned = True
-                    except discord.Forbidden as e:
-                        print(f"Method 2 failed - Missing permissions: {e}")
-                    except Exception as e:
-                        print(f"Method 2 failed - Error: {e}")
+                )
+                log.info("Created role '%s' guild=%s position=%d", role_name, guild.id, verified_role.position)
                 
-                if not role_assigned:
-                    # Send admin notification in verification channel
-                    verify_channel = discord.utils.get(guild.channels, name=VERIFY_CHANNEL_NAME)
-                    if verify_channel:
-                        admin_embed = discord.Embed(
-                            title="🔧 Attribution de rôle manuelle nécessaire",
-                            description=f"**{member.mention} a complété la vérification** mais je ne peux pas attribuer les rôles automatiquement.\n\n**Action requise par l'administrateur:**\nVeuillez attribuer manuellement le rôle `{VERIFIED_ROLE_NAME}` à {member.mention}",
-                            color=0xffa500
-                        )
-                        await verify_channel.send(embed=admin_embed)
-                    
-                    # Also send DM to user
+                # Try to move the verified role below the bot role
+                bot_member = guild.me
+                if bot_member and bot_member.top_role.position > 1:
                     try:
-                        user_embed = discord.Embed(
-                            title="✅ Vérification complète - Revue requise par l'administrateur",
-                            description=f"Vous avez répondu avec succès à toutes les questions de vérification! Un administrateur a été notifié pour attribuer manuellement votre rôle `{VERIFIED_ROLE_NAME}`.",
-                            color=0x00ff00
+                        await self.send_request(
+                            PRIORITY_COMPLETION, ('guild', guild.id),
+                            lambda: verified_role.edit(position=bot_member.top_role.position - 1)
                         )
-                        await member.send(embed=user_embed)
-                    except:
-                        pass
-                    
-                    print(f"Role assignment failed for {member} - admin notification sent")
-                    # Continue with webhook submission even if role assignment fails
-                else:
-                    print("Role assignment successful!")
+                        log.info("Moved role '%s' position=%d", role_name, verified_role.position)
+                    except Exception as e:
+                        log.warning("Failed to move verified role position: %s", e)
+                        
+            except Exception as e:
+                log.error("Failed to create verified role guild=%s: %s", guild.id, e)
+                return False
+        else:
+            log.debug("Found role '%s' position=%d", role_name, verified_role.position)
+        
+        # Debug: Check role hierarchy (lower position number = higher in hierarchy)
+        if bot_member and verified_role.position >= bot_member.top_role.position:
+            log.warning("Role hierarchy issue guild=%s: bot top role position %d must be above '%s' position %d; "
+                        "move the bot role higher in the server role list",
+                        guild.id, bot_member.top_role.position, role_name, verified_role.position)
+        
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Assigning role '%s' user=%s current_roles=%s",
+                      role_name, member.id, [role.name for role in member.roles])
+        
+        # Check if user already has the role
+        if verified_role in member.roles:
+            log.info("Member already has role '%s' user=%s", role_name, member.id)
+            return True
+        
+        role_assigned, error = await self.assign_verified_role(member, guild, verified_role, PRIORITY_COMPLETION)
+        
+        if not role_assigned:
+            # Queue the grant; it is retried once the bot's role or permissions are fixed
+            self.pending_grants.add(guild.id, member.id, error)
             
-            # Send DM confirmation
-            try:
-                dm_embed = discord.Embed(
-                    title="🎉 Vous êtes maintenant vérifié! Bienvenue à bord!",
-                    description="Merci d'avoir complété le processus de vérification. Vous avez maintenant accès à tous les canaux de la communauté Amazon FBA!",
-                    color=0x00ff00
+            # Send admin notification in verification channel
+            verify_channel = self.guild_index.verify_channel(guild)
+            if verify_channel:
+                admin_embed = questionnaire.embed('admin', member=member.mention)
+                await self.send_request(
+                    PRIORITY_ADMIN, ('channel', verify_channel.id),
+                    lambda: verify_channel.send(embed=admin_embed)
                 )
-                await member.send(embed=dm_embed)
-            except discord.Forbidden:
-                print(f"Could not send DM to {member} (DMs might be disabled)")
             
-            # Send data to GoHighLevel webhook
-            await self.send_to_webhook(member, session)
-            
-            # Clean up the session
-            del self.verification_sessions[member.id]
+            # Also send DM to user
+            try:
+                user_embed = questionnaire.embed('review')
+                await self.send_request(PRIORITY_COMPLETION, ('dm', member.id), lambda: member.send(embed=user_embed))
+            except discord.HTTPException:
+                pass
             
+            log.error("Role assignment failed user=%s guild=%s, queued for retry and admin notified", member.id, guild.id)
+        else:
+            log.info("Role assignment successful user=%s", member.id)
+        return role_assigned
+    
+    async def assign_verified_role(self, member, guild, verified_role, priority):
+        """Try add_roles, then member.edit; returns (assigned, last error)"""
+        error = None
+        role_name = verified_role.name
+        
+        # Method 1: Direct role assignment
+        try:
+            await self.send_request(
+                priority, ('guild', guild.id),
+                lambda: member.add_roles(verified_role, reason="Completed verification process")
+            )
+            log.debug("Assigned role '%s' user=%s method=add_roles", role_name, member.id)
+            return True, None
+        except discord.Forbidden as e:
+            log.warning("add_roles failed (missing permissions) user=%s: %s", member.id, e)
+            error = str(e)
+        except Exception as e:
+            log.warning("add_roles failed user=%s: %s", member.id, e)
+            error = str(e)
+        
+        # Method 2: Try editing member roles directly
+        try:
+            new_roles = list(member.roles) + [verified_role]
+            await self.send_request(
+                priority, ('guild', guild.id),
+                lambda: member.edit(roles=new_roles, reason="Completed verification process")
+            )
+            log.debug("Assigned role '%s' user=%s method=edit", role_name, member.id)
+            return True, None
+        except discord.Forbidden as e:
+            log.warning("member.edit failed (missing permissions) user=%s: %s", member.id, e)
+            error = str(e)
         except Exception as e:
-            print(f"Error completing verification: {e}")
+            log.warning("member.edit failed user=%s: %s", member.id, e)
+            error = str(e)
+        return False, error
+    
+    def can_grant_role(self, guild, role):
+        """Whether the bot's permissions and role position allow it to assign `role`"""
+        bot_member = guild.me
+        if bot_member is None or role is None:
+            return False
+        permissions = bot_member.guild_permissions
+        if not (permissions.manage_roles or permissions.administrator):
+            return False
+        return role.position < bot_member.top_role.position
+    
+    def schedule_grant_retry(self, guild):
+        """Start retrying a guild's queued grants unless a retry is already running"""
+        if self.pending_grants is None:
+            return
+        task = self.grant_retry_tasks.get(guild.id)
+        if task is None or task.done():
+            self.grant_retry_tasks[guild.id] = asyncio.create_task(self.retry_pending_grants(guild))
+    
+    async def grant_retry_sweeper(self):
+        """Background task that periodically retries queued grants in every affected guild"""
+        while True:
+            await asyncio.sleep(ROLE_RETRY_INTERVAL)
+            for guild_id in self.pending_grants.guild_ids():
+                guild = self.get_guild(guild_id)
+                if guild is not None:
+                    self.schedule_grant_retry(guild)
+    
+    async def retry_pending_grants(self, guild):
+        """Apply a guild's queued grants in batches of ROLE_RETRY_BATCH.
+        
+        Nothing is sent while the bot still lacks the permission or role position, and the
+        run stops at the first failure so a still-broken setup costs one request per sweep.
+        """
+        try:
+            verified_role = self.guild_index.verified_role(guild)
+            if not self.can_grant_role(guild, verified_role):
+                return
+            
+            granted = 0
+            while True:
+                user_ids = self.pending_grants.for_guild(guild.id, ROLE_RETRY_BATCH)
+                if not user_ids:
+                    break
+                results = await asyncio.gather(*(self.retry_grant(guild, verified_role, user_id) for user_id in user_ids))
+                granted += sum(results)
+                if not all(results):
+                    break
+            
+            if granted:
+                log.info("Applied queued role grants count=%d guild=%s", granted, guild.id)
+        except Exception:
+            log.exception("Error retrying role grants guild=%s", guild.id)
+    
+    async def retry_grant(self, guild, verified_role, user_id):
+        """Grant one queued role; members who left are dropped from the queue"""
+        member = await self.resolve_member(guild, user_id)
+        if member is None:
+            self.pending_grants.remove(guild.id, user_id)
+            return True
+        if member.get_role(verified_role.id) is None:
+            assigned, error = await self.assign_verified_role(member, guild, verified_role, PRIORITY_ADMIN)
+            if not assigned:
+                self.pending_grants.record_failure(guild.id, user_id, error)
+                return False
+            await self.send_completion_dm(member)
+        self.pending_grants.remove(guild.id, user_id)
+        self.metrics.inc('verifybot_role_grant_retries_total')
+        return True
+    
+    async def confirm_after_grant(self, member, role_stage):
+        """DM stage that waits for the role stage; a failed grant is confirmed later by retry_grant"""
+        if not (await asyncio.shield(role_stage)).ok:
+            return StageResult('dm', True, 0.0, 'deferred until the role is granted')
+        return await self.run_stage('dm', self.send_completion_dm(member), COMPLETION_DM_TIMEOUT)
+    
+    async def send_completion_dm(self, member):
+        """Send the verification confirmation DM"""
+        try:
+            dm_embed = self.questionnaires.for_guild(member.guild.id).embed('completion')
+            await self.send_request(PRIORITY_COMPLETION, ('dm', member.id), lambda: member.send(embed=dm_embed))
+            return True
+        except discord.Forbidden:
+            log.info("Could not send DM user=%s (DMs might be disabled)", member.id)
+            return False
+    
+    def build_webhook_payload(self, member, session):
+        """Build the GoHighLevel payload for a verified member"""
+        sanitized_username = re.sub(r'[^a-zA-Z0-9._]', '_', member.name)
+        payload = {
+            "username": f"{member.name}#{member.discriminator}" if member.discriminator != "0" else member.name,
+            "user_id": str(member.id),
+            "join_date": session.join_date.isoformat(),
+            "email": f"{sanitized_username}@discord.com",
+            "phone": "+1111111111",
+            "tag":"Discord",
+            "answers": {}
+        }
+        
+        # Map answers to the guild's question keys
+        keys = self.questionnaires.for_guild(session.guild_id).keys
+        for i, answer in enumerate(session.answers):
+            if i < len(keys):
+                payload["answers"][keys[i]] = answer
+        
+        return payload
     
     async def send_to_webhook(self, member, session):
-        """Send verification data to GoHighLevel webhook"""
+        """Queue verification data for delivery to the GoHighLevel webhook"""
         try:
             if not GOHIGHLEVEL_WEBHOOK_URL:
-                print("Warning: GOHIGHLEVEL_WEBHOOK_URL not set")
+                log.warning("GOHIGHLEVEL_WEBHOOK_URL not set")
                 return
             
-            # Prepare the payload
-            sanitized_username = re.sub(r'[^a-zA-Z0-9._]', '_', member.name)
-            payload = {
-                "username": f"{member.name}#{member.discriminator}" if member.discriminator != "0" else member.name,
-                "user_id": str(member.id),
-                "join_date": session['join_date'].isoformat(),
-                "email": f"{sanitized_username}@discord.com",
-                "phone": "+1111111111",
-                "tag":"Discord",
-                "answers": {}
-            }
-            
-            # Map answers to question keys
-            for i, answer in enumerate(session['answers']):
-                if i < len(QUESTION_KEYS):
-                    payload["answers"][QUESTION_KEYS[i]] = answer
-            
-            # Send the webhook request
-            async with aiohttp.ClientSession() as session_http:
-                async with session_http.post(
-                    GOHIGHLEVEL_WEBHOOK_URL,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    if response.status == 200:
-                        print(f"Successfully sent webhook data for {member}")
-                    else:
+            # Only a local append here; the outbox worker does the actual POST
+            self.outbox.enqueue(self.build_webhook_payload(member, session))
+            self.outbox_wakeup.set()
+            return True
+        
+        except Exception:
+            log.exception("Error queueing webhook user=%s", member.id)
+            return False
+    
+    async def post_webhook(self, payload, url=None):
+        """POST one payload to the webhook; returns (delivered, retryable, error)"""
+        with self.metrics.timer('verifybot_stage_seconds', stage='webhook_post'):
+            try:
+                async with self.webhook_semaphore:
+                    async with self.http_session.post(
+                        url or GOHIGHLEVEL_WEBHOOK_URL,
+                        json=payload,
+                        headers={'Content-Type': 'application/json'}
+                    ) as response:
+                        if 200 <= response.status < 300:
+                            return True, False, None
                         response_text = await response.text()
-                        print(f"Webhook request failed with status {response.status}: {response_text}")
+                        retryable = response.status in (408, 429) or response.status >= 500
+                        return False, retryable, f"HTTP {response.status}: {response_text[:500]}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return False, True, f"{type(e).__name__}: {e}"
+    
+    def record_delivery(self, row_id, payload, attempts, delivered, retryable, error):
+        """Record the outcome of one outbox row's delivery attempt"""
+        if delivered:
+            self.outbox.mark_delivered(row_id)
+            self.metrics.inc('verifybot_webhook_deliveries_total', result='delivered')
+            log.info("Webhook delivered user=%s", payload.get('user_id'))
+        elif self.outbox.mark_failed(row_id, attempts + 1, error, retryable):
+            self.metrics.inc('verifybot_webhook_deliveries_total', result='retry')
+            log.warning("Webhook delivery failed user=%s attempt=%d, will retry: %s", payload.get('user_id'), attempts + 1, error)
+        else:
+            self.metrics.inc('verifybot_webhook_deliveries_total', result='dead')
+            log.error("Webhook delivery dead-lettered user=%s: %s", payload.get('user_id'), error)
+        return delivered
+    
+    async def deliver_outbox_row(self, row_id, payload, attempts):
+        """Deliver one outbox row and record the outcome"""
+        delivered, retryable, error = await self.post_webhook(payload)
+        return self.record_delivery(row_id, payload, attempts, delivered, retryable, error)
+    
+    async def collect_webhook_batch(self, rows):
+        """Wait up to WEBHOOK_BATCH_INTERVAL_MS for the batch to fill to WEBHOOK_BATCH_SIZE"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WEBHOOK_BATCH_INTERVAL_MS / 1000
+        while len(rows) < WEBHOOK_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self.outbox_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.outbox_wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            rows = self.outbox.due(limit=WEBHOOK_BATCH_SIZE)
+        return rows
+    
+    async def flush_webhook_batch(self, rows):
+        """Deliver a batch of outbox rows as one bulk request or a bounded fan-out"""
+        started = time.perf_counter()
+        if WEBHOOK_BATCH_MODE == 'bulk' and len(rows) > 1:
+            delivered, retryable, error = await self.post_webhook(
+                {"records": [payload for _, payload, _ in rows]},
+                url=WEBHOOK_BULK_URL
+            )
+            results = [
+                self.record_delivery(row_id, payload, attempts, delivered, retryable, error)
+                for row_id, payload, attempts in rows
+            ]
+        else:
+            results = await asyncio.gather(*(self.deliver_outbox_row(*row) for row in rows))
         
-        except Exception as e:
-            print(f"Error sending webhook: {e}")
+        delivered_count = sum(1 for result in results if result)
+        self.webhook_stats['flushes'] += 1
+        self.webhook_stats['items'] += len(rows)
+        self.webhook_stats['delivered'] += delivered_count
+        self.webhook_stats['failed'] += len(rows) - delivered_count
+        if WEBHOOK_BATCH_SIZE > 1:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            log.info("Webhook flush mode=%s items=%d delivered=%d failed=%d elapsed_ms=%.0f",
+                     WEBHOOK_BATCH_MODE, len(rows), delivered_count, len(rows) - delivered_count, elapsed_ms)
+    
+    async def outbox_worker(self):
+        """Background task that drains the webhook outbox with retry/backoff"""
+        batch_limit = WEBHOOK_BATCH_SIZE if WEBHOOK_BATCH_SIZE > 1 else OUTBOX_DRAIN_BATCH
+        while True:
+            try:
+                self.outbox_wakeup.clear()
+                rows = self.outbox.due(limit=batch_limit)
+                if rows:
+                    if WEBHOOK_BATCH_SIZE > 1:
+                        rows = await self.collect_webhook_batch(rows)
+                    await self.flush_webhook_batch(rows)
+                    continue
+                
+                # Sleep until the next retry is due or a new payload is queued
+                next_due = self.outbox.next_due_at()
+                delay = OUTBOX_POLL_INTERVAL if next_due is None else max(0.0, next_due - time.time())
+                try:
+                    await asyncio.wait_for(self.outbox_wakeup.wait(), timeout=min(delay, OUTBOX_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Error in outbox worker")
+                await asyncio.sleep(5)
+
+def outbox_cli(args):
+    """Inspect or replay the webhook outbox: python bot.py outbox [stats|replay]"""
+    command = args[0] if args else 'stats'
+    outbox = WebhookOutbox()
+    try:
+        if command == 'stats':
+            counts = outbox.counts()
+            print(f"pending={counts.get('pending', 0)} dead={counts.get('dead', 0)}")
+        elif command == 'replay':
+            replayed = outbox.replay_dead()
+            print(f"Moved {replayed} dead-lettered webhook(s) back to pending")
+        else:
+            print("Usage: python bot.py outbox [stats|replay]")
+    finally:
+        outbox.close()
+
+def review_cli(args):
+    """Review answers held by the spam filter: python bot.py review [list|approve ID|reject ID]"""
+    command = args[0] if args else 'list'
+    queue = ReviewQueue()
+    try:
+        if command == 'list':
+            for row_id, guild_id, user_id, payload, reasons in queue.pending():
+                print(f"#{row_id} guild={guild_id} user={user_id} ({payload['username']}) reasons={','.join(reasons)}")
+                for key, answer in payload['answers'].items():
+                    print(f"    {key}: {answer}")
+            counts = queue.counts()
+            print(f"pending={counts.get('pending', 0)} approved={counts.get('approved', 0)} rejected={counts.get('rejected', 0)}")
+        elif command in ('approve', 'reject') and len(args) == 2 and args[1].isdigit():
+            decided = queue.decide(int(args[1]), 'approved' if command == 'approve' else 'rejected')
+            if decided is None:
+                print(f"No pending review #{args[1]}")
+            elif command == 'approve':
+                # The running bot picks both up: the outbox worker and the role grant sweep
+                guild_id, user_id, payload = decided
+                outbox = WebhookOutbox()
+                grants = PendingGrants()
+                try:
+                    if GOHIGHLEVEL_WEBHOOK_URL:
+                        outbox.enqueue(payload)
+                    grants.add(guild_id, user_id, 'approved after review')
+                finally:
+                    outbox.close()
+                    grants.close()
+                print(f"Approved #{args[1]}: CRM push and role grant queued")
+            else:
+                print(f"Rejected #{args[1]}")
+        else:
+            print("Usage: python bot.py review [list|approve ID|reject ID]")
+    finally:
+        queue.close()
 
 # Create and run the bot
 def main():
+    logging.basicConfig(
+        level=LOG_LEVEL,
+        format='%(asctime)s %(levelname)s %(name)s %(message)s'
+    )
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'outbox':
+        outbox_cli(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'review':
+        review_cli(sys.argv[2:])
+        return
+    
     if not DISCORD_TOKEN:
-        print("Error: DISCORD_BOT_TOKEN not found in environment variables")
-        print("Please check your .env file or environment configuration")
+        log.error("DISCORD_BOT_TOKEN not found in environment variables; "
+                  "please check your .env file or environment configuration")
         return
     
     if not GOHIGHLEVEL_WEBHOOK_URL:
-        print("Warning: GOHIGHLEVEL_WEBHOOK_URL not found in environment variables")
-        print("Webhook functionality will be disabled")
+        log.warning("GOHIGHLEVEL_WEBHOOK_URL not found in environment variables; webhook functionality will be disabled")
     
     bot = VerificationBot()
     
     try:
-        bot.run(DISCORD_TOKEN)
+        # Logging is configured above, so discord.py should not install its own handler
+        bot.run(DISCORD_TOKEN, log_handler=None)
     except discord.LoginFailure:
-        print("Error: Invalid Discord bot token")
-    except Exception as e:
-        print(f"Error running bot: {e}")
+        log.error("Invalid Discord bot token")
+    except Exception:
+        log.exception("Error running bot")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,68 @@
+import asyncio
+
+from bot import PRIORITY_BACKFILL, PRIORITY_PROMPT, PRIORITY_WELCOME, OutboundScheduler, TokenBucket
+
+
+def test_token_bucket_reserves_future_slots():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert bucket.take() == 0
+    first = bucket.take()
+    second = bucket.take()
+    assert 0.09 < first <= 0.1
+    assert 0.19 < second <= 0.2
+
+
+def test_parked_requests_wake_once_and_keep_their_order():
+    async def run():
+        scheduler = OutboundScheduler(workers=4, prompt_workers=1, channel_rate=200, channel_burst=1)
+        unparks = 0
+        unpark = scheduler.unpark
+
+        def counting_unpark(item):
+            nonlocal unparks
+            unparks += 1
+            unpark(item)
+        scheduler.unpark = counting_unpark
+
+        tasks = scheduler.start()
+        order = []
+
+        async def request(index):
+            order.append(index)
+
+        results = [scheduler.submit(PRIORITY_WELCOME, ('channel', 1), lambda index=index: request(index))
+                   for index in range(40)]
+        await asyncio.gather(*results)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return unparks, order
+
+    unparks, order = asyncio.run(run())
+    assert unparks < 40
+    assert order == list(range(40))
+
+
+def test_prompts_run_while_general_workers_are_busy():
+    async def run():
+        scheduler = OutboundScheduler(workers=1, prompt_workers=1)
+        tasks = scheduler.start()
+        blocker = asyncio.Event()
+
+        async def slow():
+            await blocker.wait()
+
+        async def prompt():
+            return 'sent'
+
+        backfill = asyncio.ensure_future(scheduler.submit(PRIORITY_BACKFILL, ('channel', 1), slow))
+        await asyncio.sleep(0)
+        result = await asyncio.wait_for(scheduler.submit(PRIORITY_PROMPT, ('dm', 2), prompt), timeout=1)
+        blocker.set()
+        await backfill
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return result
+
+    assert asyncio.run(run()) == 'sent'
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+from bot import SpamFilter, VerificationSession
+
+JOINED = datetime(2026, 1, 1, tzinfo=timezone.utc)
+NOW = JOINED + timedelta(hours=1)
+
+ANSWERS = [
+    "Je suis coach sportif et j'accompagne des entrepreneurs",
+    "Trouver plus de clients grâce à une présence en ligne",
+    "dans les 3 prochains mois",
+]
+
+
+def session(user_id, answers, joined=JOINED):
+    return VerificationSession(user_id=user_id, guild_id=1, join_date=joined, answers=list(answers))
+
+
+def test_genuine_answers_pass():
+    assert SpamFilter().check(session(1, ANSWERS), NOW) == []
+
+
+def test_shared_stock_answers_are_not_duplicates():
+    spam_filter = SpamFilter()
+    first = ["Je vends des formations en ligne", "Plus de ventes", "dans les 3 prochains mois"]
+    second = ["Je suis photographe de mariage", "Remplir mon agenda", "dans les 3 prochains mois"]
+    third = ["Consultant RH indépendant", "je ne sais pas encore", "je ne sais pas encore"]
+    fourth = ["Agent immobilier à Lyon", "je ne sais pas encore", "Dès que possible"]
+
+    assert spam_filter.check(session(1, first), NOW) == []
+    assert spam_filter.check(session(2, second), NOW) == []
+    assert spam_filter.check(session(3, third), NOW) == []
+    assert spam_filter.check(session(4, fourth), NOW) == []
+
+
+def test_identical_answer_set_from_another_member_is_duplicate():
+    spam_filter = SpamFilter()
+    assert spam_filter.check(session(1, ANSWERS), NOW) == []
+    retyped = [f"  {answer.upper()} " for answer in ANSWERS]
+    assert spam_filter.check(session(2, retyped), NOW) == ['duplicate']
+
+
+def test_same_member_resubmitting_is_not_duplicate():
+    spam_filter = SpamFilter()
+    assert spam_filter.check(session(1, ANSWERS), NOW) == []
+    assert spam_filter.check(session(1, ANSWERS), NOW) == []
+
+
+def test_short_answer_sets_are_never_matched():
+    spam_filter = SpamFilter()
+    answers = ["oui", "marketing digital", "instagram"]
+    assert spam_filter.check(session(1, answers), NOW) == []
+    assert spam_filter.check(session(2, answers), NOW) == []
+
+
+def test_duplicate_window_forgets_old_sets():
+    spam_filter = SpamFilter(window=1)
+    other = ["Artisan menuisier dans le Jura", "Développer ma clientèle locale", "d'ici la fin de l'année"]
+    spam_filter.check(session(1, ANSWERS), NOW)
+    spam_filter.check(session(2, other), NOW)
+    assert spam_filter.check(session(3, ANSWERS), NOW) == []
+
+
+def test_rule_reasons():
+    spam_filter = SpamFilter()
+    assert spam_filter.check(session(1, ["x", *ANSWERS[1:]]), NOW) == ['too_short']
+    linked = ["Rejoignez discord.gg/promo", *ANSWERS[1:]]
+    assert spam_filter.check(session(2, linked), NOW) == ['denied_pattern']
+    assert spam_filter.check(session(3, ANSWERS[:2], joined=NOW - timedelta(seconds=5)), NOW) == ['too_fast']